@@ -0,0 +1,89 @@
+"""Per-product extraction cost versus the number of selected fields.
+
+Compares the compiled ExtractionPlan with the previous per-field search
+(product.iter / attr.find for every selected field):
+
+    python benchmarks/bench_extraction.py [--attributes 60] [--products 500]
+"""
+import argparse
+import os
+import sys
+import time
+
+from lxml import etree
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from xml_translator_core import ExtractionPlan, element_string  # noqa: E402
+
+
+def make_product(attributes):
+    product = etree.Element('product', id='1')
+    for name in ('title', 'description', 'brand', 'sku'):
+        etree.SubElement(product, name).text = f"{name} text"
+    etree.SubElement(product, 'category').text = "Clothing"
+    for n in range(attributes):
+        attr = etree.SubElement(product, 'attribute')
+        etree.SubElement(attr, 'name').text = f"attr{n}"
+        etree.SubElement(attr, 'label').text = f"value {n}"
+    return product
+
+
+def make_mapping(selected):
+    fields = [{'name': 'title', 'path': '/product/title'}, {'name': 'category', 'path': '//category'}]
+    fields += [{'name': f"attribute/attr{n}", 'path': f"//attribute[name='attr{n}']/label"}
+               for n in range(max(0, selected - len(fields)))]
+    return fields[:selected]
+
+
+def per_field_nodes(product, field_mapping):
+    # The search done per field before the extraction plan
+    nodes = []
+    seen = set()
+    for field in field_mapping:
+        if field['path'].startswith('/product/'):
+            tags = [tag for tag in product.iter('{*}' + field['path'].split('/')[-1]) if tag is not product]
+        elif field['path'].startswith('//category'):
+            tags = product.iter('{*}category')
+        else:
+            attr_name = field['name'].split('/')[-1]
+            tags = []
+            for attr in product.iter('{*}attribute'):
+                name = attr.find('{*}name')
+                if name is not None and element_string(name) == attr_name:
+                    label = attr.find('{*}label')
+                    if label is not None:
+                        tags.append(label)
+        for tag in tags:
+            if element_string(tag) and tag not in seen:
+                seen.add(tag)
+                nodes.append(tag)
+    return nodes
+
+
+def timed(func, product, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        func(product)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--attributes', type=int, default=60, help="attribute children per product")
+    parser.add_argument('--products', type=int, default=500, help="products timed per measurement")
+    args = parser.parse_args()
+
+    product = make_product(args.attributes)
+    print(f"{'fields':>6} {'per-field us':>13} {'plan us':>9} {'speedup':>8}")
+    for selected in (1, 5, 10, 25, 50, args.attributes + 2):
+        mapping = make_mapping(selected)
+        plan = ExtractionPlan(mapping)
+        assert plan.nodes(product) == per_field_nodes(product, mapping)
+        legacy = timed(lambda p: per_field_nodes(p, mapping), product, args.products)
+        compiled = timed(plan.nodes, product, args.products)
+        print(f"{len(mapping):>6} {legacy:>13.1f} {compiled:>9.1f} {legacy / compiled:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
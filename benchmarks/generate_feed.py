@@ -0,0 +1,55 @@
+"""Synthetic product feeds in the shape FieldMapper expects.
+
+    python benchmarks/generate_feed.py feed.xml --products 100000 --attributes 8 --duplicates 0.8
+
+--duplicates is the share of text values drawn from a small pool of repeated values
+(colours, materials, categories); the rest are unique per product.
+"""
+import argparse
+import random
+from xml.sax.saxutils import escape
+
+WORDS = ("soft", "cotton", "classic", "slim", "fit", "shirt", "jacket", "summer", "winter", "organic",
+         "leather", "light", "warm", "casual", "sport", "elegant", "comfortable", "durable", "premium", "basic")
+REPEATED = ("Black", "White", "Red", "Blue", "Green", "Grey", "Cotton", "Polyester", "Wool", "Leather",
+            "Small", "Medium", "Large", "Men", "Women", "Kids", "Summer collection", "Machine washable")
+CATEGORIES = ("Clothing", "Shoes", "Accessories", "Sportswear", "Outdoor", "Home textiles")
+
+
+def generate_feed(path, products=1000, attributes=8, duplicates=0.8, seed=1):
+    rng = random.Random(seed)
+
+    def text(words):
+        if rng.random() < duplicates:
+            return rng.choice(REPEATED)
+        return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8"?>\n<products>\n')
+        for n in range(products):
+            f.write(f'  <product id="{n}">\n')
+            f.write(f'    <sku>SKU-{n:08d}</sku>\n')
+            f.write(f'    <title>{escape(text(4))}</title>\n')
+            f.write(f'    <description>{escape(text(25))}</description>\n')
+            f.write(f'    <price>{rng.randint(100, 99999) / 100:.2f}</price>\n')
+            f.write(f'    <category>{rng.choice(CATEGORIES)}</category>\n')
+            for a in range(attributes):
+                f.write(f'    <attribute><name>attr{a}</name><label>{escape(text(2))}</label></attribute>\n')
+            f.write('  </product>\n')
+        f.write('</products>\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic product feed")
+    parser.add_argument('output')
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--attributes', type=int, default=8, help="attribute/name/label children per product")
+    parser.add_argument('--duplicates', type=float, default=0.8, help="share of repeated text values (0-1)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    generate_feed(args.output, args.products, args.attributes, args.duplicates, args.seed)
+
+
+if __name__ == "__main__":
+    main()
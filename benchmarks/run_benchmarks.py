@@ -0,0 +1,104 @@
+"""Pipeline benchmark: field detection, extraction, translation and serialization, timed
+separately on synthetic feeds. Each stage runs in its own process so the reported peak
+RSS belongs to that stage alone. Translation uses the no-network `local` backend.
+
+    python benchmarks/run_benchmarks.py --sizes 1000,10000,100000,1000000 [--json results.json]
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from generate_feed import generate_feed  # noqa: E402
+
+STAGES = ('detect', 'extract', 'translate', 'serialize')
+
+
+def peak_rss_mb():
+    # ru_maxrss is in KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def run_stage(stage, feed, workdir):
+    from xml_translator_core import ExtractionPlan, TranslationJob, detect_fields, iter_products, stream_products
+
+    mapping = [field for field in detect_fields(feed) if field['path'] != '/product/attribute']
+    started = time.perf_counter()
+    if stage == 'detect':
+        products = max(field['count'] for field in detect_fields(feed, max_products=float('inf'), time_budget=None))
+    elif stage == 'extract':
+        plan = ExtractionPlan(mapping)
+        products = 0
+        for product in iter_products(feed):
+            plan.nodes(product)
+            products += 1
+    elif stage == 'translate':
+        job = TranslationJob(feed, os.path.join(workdir, 'translated.xml'), mapping, 'en', 'ro',
+                             concurrency=1, requests_per_second=1e9, resume=False, backend='local')
+        products = job.run()['products']
+    elif stage == 'serialize':
+        with open(feed, 'rb') as source, open(os.path.join(workdir, 'copy.xml'), 'wb') as out:
+            products = stream_products(source, out, lambda window, count: None)
+    else:
+        raise ValueError(f"Unknown stage {stage!r}")
+    elapsed = time.perf_counter() - started
+    return {
+        'stage': stage,
+        'products': products,
+        'seconds': round(elapsed, 3),
+        'products_per_second': round(products / elapsed, 1) if elapsed else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the translation pipeline on synthetic feeds")
+    parser.add_argument('--sizes', default='1000,10000,100000,1000000', help="comma separated product counts")
+    parser.add_argument('--stages', default=','.join(STAGES))
+    parser.add_argument('--attributes', type=int, default=8)
+    parser.add_argument('--duplicates', type=float, default=0.8)
+    parser.add_argument('--workdir', help="where feeds are generated and kept (default: a temporary directory)")
+    parser.add_argument('--json', help="also write the results to this file")
+    parser.add_argument('--stage', help=argparse.SUPPRESS)
+    parser.add_argument('--feed', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp(prefix='xml-translator-bench-')
+    os.makedirs(workdir, exist_ok=True)
+
+    if args.stage:
+        # Child process: run one stage and report it on stdout
+        print(json.dumps(run_stage(args.stage, args.feed, workdir)))
+        return
+
+    results = []
+    print(f"{'products':>9} {'stage':<10} {'seconds':>9} {'products/s':>11} {'peak RSS MB':>12}")
+    for size in (int(size) for size in args.sizes.split(',')):
+        feed = os.path.join(workdir, f"feed_{size}_{args.attributes}_{args.duplicates}.xml")
+        if not os.path.exists(feed):
+            generate_feed(feed, size, args.attributes, args.duplicates)
+        for stage in args.stages.split(','):
+            output = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--stage', stage, '--feed', feed, '--workdir', workdir],
+                check=True, capture_output=True, text=True
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            result['feed_mb'] = round(os.path.getsize(feed) / (1024 * 1024), 1)
+            results.append(result)
+            print(f"{size:>9} {stage:<10} {result['seconds']:>9} {result['products_per_second']:>11} "
+                  f"{result['peak_rss_mb']:>12}", flush=True)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+
+def build_feed(products=40, title='Product {n} title'):
+    # A feed with a prolog, comments, CDATA descriptions and whitespace between the products
+    items = []
+    for n in range(products):
+        items.append(
+            f'  <product id="p{n}">\n'
+            f'    <title>{title.format(n=n % 7)}</title>\n'
+            f'    <description><![CDATA[<p>Soft cotton &amp; linen, size {n % 3}</p>]]></description>\n'
+            f'    <sku>SKU-{n:05d}</sku>\n'
+            f'  </product>\n'
+            + ('  <!-- page break -->\n' if n % 10 == 9 else '')
+        )
+    return ('<?xml version="1.0" encoding="utf-8"?>\n'
+            '<!-- exported feed -->\n'
+            '<catalog xmlns:g="http://base.google.com/ns/1.0">\n'
+            '  <info>Spring <b>collection</b></info>\n'
+            '  <products>\n'
+            + ''.join(items) +
+            '  </products>\n'
+            '</catalog>\n').encode('utf-8')
+
+
+FIELDS = [
+    {'name': 'title', 'path': '/product/title'},
+    {'name': 'description', 'path': '/product/description'},
+    {'name': 'sku', 'path': '/product/sku'},
+]
+
+
+@pytest.fixture
+def feed(tmp_path):
+    path = tmp_path / 'feed.xml'
+    path.write_bytes(build_feed())
+    return str(path)
+
+
+class FakeGoogleTranslator:
+    """Offline stand-in for deep_translator.GoogleTranslator: "text" -> "[target] text"."""
+
+    calls = []
+
+    def __init__(self, source, target):
+        self.target = target
+
+    def translate(self, text):
+        self.calls.append(text)
+        return '\n'.join(f"[{self.target}] {line}" for line in text.split('\n'))
+
+    def translate_batch(self, texts):
+        return [self.translate(text) for text in texts]
+
+
+@pytest.fixture
+def fake_google(monkeypatch):
+    deep_translator = pytest.importorskip('deep_translator')
+    monkeypatch.setattr(deep_translator, 'GoogleTranslator', FakeGoogleTranslator)
+    monkeypatch.setattr(FakeGoogleTranslator, 'calls', [])
+    return FakeGoogleTranslator
@@ -0,0 +1,90 @@
+import pytest
+from conftest import FIELDS
+
+import xml_translator_core
+from xml_translator_backends import (BackendError, ConfigurationError, LocalBackend, create_backend, decode_entities,
+                                    parse_backend_options)
+from xml_translator_core import CircuitBreaker, TranslationJob
+
+
+def test_parse_backend_options():
+    assert parse_backend_options(['latency=0.2', 'url=http://mt:5000', 'max_batch=3']) == {
+        'latency': 0.2, 'url': 'http://mt:5000', 'max_batch': 3}
+    with pytest.raises(ValueError):
+        parse_backend_options(['latency'])
+
+
+def test_unknown_backend_is_rejected(feed, tmp_path):
+    with pytest.raises(ValueError):
+        create_backend('nope', 'en', 'de')
+    with pytest.raises(ValueError):
+        TranslationJob(feed, str(tmp_path / 'out.xml'), FIELDS, 'en', 'de', backend='nope')
+
+
+def test_local_backend_batches_requests():
+    backend = create_backend('local', 'en', 'de', max_batch=3)
+    assert backend.translate_batch(['a', 'b', 'c', 'd']) == ['[de] a', '[de] b', '[de] c', '[de] d']
+    assert backend.requests == 2
+    assert backend.requests_for(['a'] * 7) == 3
+
+
+def test_job_uses_the_selected_backend(feed, tmp_path):
+    output = str(tmp_path / 'out.xml')
+    job = TranslationJob(feed, output, FIELDS, 'en', 'de', requests_per_second=1e6, resume=False,
+                         backend='local', backend_options={'max_batch': 4})
+    assert job.run()['products'] == 40
+    with open(output, 'rb') as f:
+        assert b'<title>[de] Product 1 title</title>' in f.read()
+
+
+def test_decode_entities():
+    assert decode_entities("it's \"new\"", 'c&#39;est &quot;nouveau&quot;') == 'c\'est "nouveau"'
+    # Texts that had entities of their own get their translation back unchanged
+    assert decode_entities('5 &lt; 10', '5 &lt; 10') == '5 &lt; 10'
+    assert decode_entities('<p>Fish &amp; chips</p>', '<p>Fisch &amp; Pommes</p>') == '<p>Fisch &amp; Pommes</p>'
+
+
+def test_configuration_errors_fail_the_job(feed, tmp_path, monkeypatch):
+    def rejected(self, text):
+        raise ConfigurationError("HTTP 403: invalid API key")
+
+    monkeypatch.setattr(LocalBackend, '_translate', rejected)
+    job = TranslationJob(feed, str(tmp_path / 'out.xml'), FIELDS, 'en', 'de', backend='local', resume=False)
+    paused = []
+    job.on_paused = lambda: paused.append(True)
+    with pytest.raises(ConfigurationError, match='invalid API key'):
+        job.run()
+    assert not paused
+
+
+def test_rejected_strings_are_left_untranslated(feed, tmp_path, monkeypatch):
+    translate = LocalBackend._translate
+
+    def reject_one(self, text):
+        if 'size 1' in text:
+            raise BackendError("HTTP 400: could not translate")
+        return translate(self, text)
+
+    monkeypatch.setattr(LocalBackend, '_translate', reject_one)
+    output = tmp_path / 'out.xml'
+    job = TranslationJob(feed, str(output), FIELDS, 'en', 'de', backend='local', requests_per_second=1e6,
+                         resume=False)
+    notices = []
+    job.on_notice = notices.append
+    result = job.run()
+    assert result['products'] == 40
+    assert result['untranslated'] == 1
+    assert notices == ['1 strings could not be translated and keep their original text']
+    data = output.read_bytes()
+    assert data.count(b'<![CDATA[<p>Soft cotton &amp; linen, size 1</p>]]>') == 13
+    assert data.count(b'<title>[de] Product') == 40
+
+
+def test_job_fails_when_the_circuit_keeps_opening(feed, tmp_path, monkeypatch):
+    monkeypatch.setattr(xml_translator_core, 'CircuitBreaker',
+                        lambda: CircuitBreaker(threshold=2, cooldown=0.01, max_cooldown=0.02))
+    job = TranslationJob(feed, str(tmp_path / 'out.xml'), FIELDS, 'en', 'de', backend='local',
+                         backend_options={'failure_rate': 1.0}, resume=False)
+    job.retry_delay = 0.001
+    with pytest.raises(BackendError, match='kept failing after 3 pauses'):
+        job.run()
@@ -0,0 +1,30 @@
+import json
+
+from conftest import FIELDS, build_feed
+
+from xml_translator_cli import main
+from xml_translator_core import TranslationMemory, save_field_mapping
+
+
+def test_jobs_share_the_translation_memory(tmp_path, capsys):
+    feeds = tmp_path / 'feeds'
+    feeds.mkdir()
+    for n in range(4):
+        (feeds / f'feed{n}.xml').write_bytes(build_feed(products=20 + n))
+    mapping = str(tmp_path / 'mapping.json')
+    save_field_mapping(mapping, FIELDS)
+    memory = str(tmp_path / 'memory.db')
+
+    assert main(['translate', str(feeds), '-m', mapping, '-l', 'en:de', '-o', str(tmp_path / 'out'),
+                 '--jobs', '2', '--backend', 'local', '--rate', '1000', '--memory', memory]) == 0
+    lines = [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+    assert [line['ok'] for line in lines[:-1]] == [True] * 4
+    assert lines[-1]['totals']['files'] == 4
+    assert lines[-1]['totals']['failed'] == 0
+    assert (tmp_path / 'out' / 'translated_feed3.xml').exists()
+
+    stored = TranslationMemory(memory, evict_on_open=False)
+    try:
+        assert stored.get('local', 'en', 'de', 'Product 1 title') == '[de] Product 1 title'
+    finally:
+        stored.close()
@@ -0,0 +1,65 @@
+from conftest import FIELDS, build_feed
+
+from xml_translator_core import TranslationJob
+
+
+def run_delta(feed, output, state, target_lang='de', fields=FIELDS, **options):
+    job = TranslationJob(feed, output, fields, 'en', target_lang, requests_per_second=1e6,
+                         resume=False, delta_state=state, **options)
+    job.window_size = 5
+    return job.run()
+
+
+def test_unchanged_products_are_reused_without_calls(feed, tmp_path, fake_google):
+    state = str(tmp_path / 'out.delta')
+    first = str(tmp_path / 'first.xml')
+    assert run_delta(feed, first, state)['unchanged_products'] == 0
+    assert fake_google.calls
+
+    del fake_google.calls[:]
+    second = str(tmp_path / 'second.xml')
+    assert run_delta(feed, second, state)['unchanged_products'] == 40
+    assert fake_google.calls == []
+    with open(first, 'rb') as a, open(second, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_changed_product_is_retranslated(feed, tmp_path, fake_google):
+    state = str(tmp_path / 'out.delta')
+    run_delta(feed, str(tmp_path / 'first.xml'), state)
+
+    data = build_feed().replace(b'<title>Product 3 title</title>', b'<title>Renamed title</title>', 1)
+    with open(feed, 'wb') as f:
+        f.write(data)
+    del fake_google.calls[:]
+    output = str(tmp_path / 'second.xml')
+    assert run_delta(feed, output, state)['unchanged_products'] == 39
+    assert any('Renamed title' in text for text in fake_google.calls)
+    with open(output, 'rb') as f:
+        assert b'<title>[de] Renamed title</title>' in f.read()
+
+
+def test_scope_change_invalidates_the_state(feed, tmp_path, fake_google):
+    state = str(tmp_path / 'out.delta')
+    run_delta(feed, str(tmp_path / 'first.xml'), state)
+
+    assert run_delta(feed, str(tmp_path / 'fr.xml'), state, target_lang='fr')['unchanged_products'] == 0
+    assert run_delta(feed, str(tmp_path / 'title.xml'), state, fields=FIELDS[:1])['unchanged_products'] == 0
+
+
+def test_prefilter_change_invalidates_the_state(feed, tmp_path, fake_google):
+    state = str(tmp_path / 'out.delta')
+    run_delta(feed, str(tmp_path / 'first.xml'), state)
+
+    output = str(tmp_path / 'second.xml')
+    assert run_delta(feed, output, state, prefilter={'protect': ['Product']})['unchanged_products'] == 0
+    with open(output, 'rb') as f:
+        assert b'<title>[de] Product 1 title</title>' in f.read()
+
+
+def test_backend_change_invalidates_the_state(feed, tmp_path, fake_google):
+    state = str(tmp_path / 'out.delta')
+    run_delta(feed, str(tmp_path / 'first.xml'), state, backend='local')
+
+    assert run_delta(feed, str(tmp_path / 'second.xml'), state)['unchanged_products'] == 0
+    assert fake_google.calls
@@ -0,0 +1,31 @@
+from xml_translator_core import detect_fields
+
+
+def by_path(fields):
+    return {field['path']: field for field in fields}
+
+
+def test_fields_are_merged_over_the_sample(tmp_path):
+    path = tmp_path / 'feed.xml'
+    path.write_text(
+        '<catalog>'
+        + ''.join(f'<product><title>Title {n % 5}</title>'
+                  + (f'<color>Red {n}</color>' if n % 4 == 0 else '')
+                  + '<attribute><name>size</name><label>M</label></attribute></product>'
+                  for n in range(20))
+        + '</catalog>', encoding='utf-8')
+
+    fields = by_path(detect_fields(str(path), time_budget=None))
+    assert fields['/product/title']['count'] == 20
+    assert fields['/product/title']['samples'] == ['Title 0', 'Title 1', 'Title 2']
+    assert fields['/product/color']['count'] == 5
+    assert fields["//attribute[name='size']/label"]['count'] == 20
+
+
+def test_sample_is_bounded(feed):
+    assert by_path(detect_fields(feed, max_products=7))['/product/title']['count'] == 7
+    assert by_path(detect_fields(feed, max_products=1000, time_budget=1e-9))['/product/title']['count'] == 1
+
+
+def test_missing_file_has_no_fields(tmp_path):
+    assert detect_fields(str(tmp_path / 'missing.xml')) == []
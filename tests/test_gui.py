@@ -0,0 +1,83 @@
+import os
+import time
+
+import pytest
+from conftest import FIELDS
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+QtCore = pytest.importorskip('PyQt5.QtCore')
+
+from PyQt5.QtWidgets import QApplication  # noqa: E402
+
+from xml_translator_gui import FieldFilterModel, FieldModel, TranslationWorker  # noqa: E402
+
+Qt = QtCore.Qt
+
+
+def make_model(count=5):
+    model = FieldModel()
+    model.set_fields([{'name': f'attribute/attr{n}', 'path': f"//attribute[name='attr{n}']/label",
+                       'sample': f'value {n}', 'samples': [f'value {n}'], 'count': n} for n in range(count)]
+                     + [{'name': 'title', 'path': '/product/title', 'sample': 'Shirt', 'count': 9}])
+    return model
+
+
+def test_field_model_cells_and_checks():
+    model = make_model()
+    assert model.rowCount() == 6 and model.columnCount() == 5
+    assert model.data(model.index(5, FieldModel.NAME)) == 'title'
+    assert model.data(model.index(1, FieldModel.PRODUCTS)) == '1'
+    assert model.data(model.index(0, FieldModel.TRANSLATE), Qt.CheckStateRole) == Qt.Checked
+
+    assert model.setData(model.index(0, FieldModel.TRANSLATE), Qt.Unchecked, Qt.CheckStateRole)
+    assert model.setData(model.index(5, FieldModel.NAME), ' heading ')
+    assert not model.setData(model.index(5, FieldModel.PATH), '/other')
+    selected = model.selected_fields()
+    assert len(selected) == 5
+    assert selected[-1] == {'name': 'heading', 'path': '/product/title', 'sample': 'Shirt'}
+
+
+def test_set_checked_by_pattern():
+    model = make_model()
+    assert model.set_checked('attr*', False) == 5
+    assert [field['name'] for field in model.selected_fields()] == ['title']
+    assert model.set_checked('TITLE', False) == 1
+    assert model.selected_fields() == []
+    assert model.set_checked('', True) == 6
+
+
+def test_apply_mapping_checks_and_adds_fields():
+    model = make_model()
+    added = model.apply_mapping([{'name': 'Title', 'path': '/product/title'},
+                                 {'name': 'brand', 'path': '/product/brand'}])
+    assert added == 1
+    assert [(field['name'], field['path']) for field in model.selected_fields()] == [
+        ('Title', '/product/title'), ('brand', '/product/brand')]
+
+
+def test_filter_model():
+    model = make_model()
+    proxy = FieldFilterModel()
+    proxy.setSourceModel(model)
+    proxy.set_filter('attr?')
+    assert proxy.rowCount() == 5
+    proxy.set_filter('title')
+    assert proxy.rowCount() == 1
+    proxy.set_filter('')
+    assert proxy.rowCount() == 6
+
+
+def test_worker_delivers_held_updates(feed, tmp_path):
+    app = QApplication.instance() or QApplication([])
+    worker = TranslationWorker(feed, str(tmp_path / 'out.xml'), FIELDS, 'en', 'de', backend='local')
+    messages = []
+    worker.field_progress.connect(messages.append)
+    for message in ('first', 'second', 'third'):
+        worker.coalesce('field_progress', (message,))
+    assert messages == ['first']
+
+    deadline = time.monotonic() + 2.0
+    while len(messages) < 2 and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.01)
+    assert messages == ['first', 'third (and 1 earlier, not shown)']
@@ -0,0 +1,38 @@
+import threading
+import time
+
+from conftest import FIELDS
+
+from xml_translator_core import MultiTargetJob, ShardedJob, TranslationJob
+
+
+def run_paused(job, seconds=0.2):
+    # Starts the job paused, resumes it from another thread; returns the summary and the run time
+    assert callable(job.resume)
+    job.pause()
+    timer = threading.Timer(seconds, job.resume)
+    timer.start()
+    started = time.monotonic()
+    try:
+        return job.run(), time.monotonic() - started
+    finally:
+        timer.cancel()
+
+
+def test_paused_job_resumes(feed, tmp_path, fake_google):
+    job = TranslationJob(feed, str(tmp_path / 'out.xml'), FIELDS, 'en', 'de', requests_per_second=1e6,
+                         resume=False)
+    result, elapsed = run_paused(job)
+    assert result['products'] == 40
+    assert elapsed >= 0.2
+    # The checkpoint setting does not hide the method
+    assert job.resume_enabled is False
+
+
+def test_paused_multi_target_and_sharded_jobs_resume(feed, tmp_path):
+    outputs = {'de': str(tmp_path / 'out_de.xml'), 'fr': str(tmp_path / 'out_fr.xml')}
+    for job in (MultiTargetJob(feed, outputs, FIELDS, 'en', backend='local', resume=False),
+                ShardedJob(feed, outputs, FIELDS, 'en', backend='local', resume=False, processes=1)):
+        result, elapsed = run_paused(job)
+        assert result['products'] == 40
+        assert elapsed >= 0.2
@@ -0,0 +1,92 @@
+import json
+import os
+
+import pytest
+from conftest import FIELDS
+
+from xml_translator_core import TranslationJob, TranslationStopped
+
+
+def make_job(feed, output, fields=FIELDS, **options):
+    job = TranslationJob(feed, output, fields, 'en', 'de', requests_per_second=1e6, **options)
+    job.window_size = 5
+    job.checkpoint_interval = 0.0
+    return job
+
+
+def stop_after(job, windows):
+    seen = []
+
+    def progress(current, total, message):
+        seen.append(message)
+        if len(seen) == windows:
+            job.stop()
+
+    job.on_progress = progress
+
+
+def test_stopped_job_resumes_to_the_same_output(feed, tmp_path, fake_google):
+    reference = str(tmp_path / 'reference.xml')
+    make_job(feed, reference, resume=False).run()
+
+    output = str(tmp_path / 'out.xml')
+    job = make_job(feed, output)
+    stop_after(job, 3)
+    with pytest.raises(TranslationStopped):
+        job.run()
+    assert not os.path.exists(output)
+    assert os.path.exists(output + '.part') and os.path.exists(output + '.journal')
+
+    job = make_job(feed, output)
+    result = job.run()
+    assert result['resumed_products'] == 15
+    assert result['products'] == 40
+    assert not os.path.exists(output + '.part') and not os.path.exists(output + '.journal')
+    with open(reference, 'rb') as a, open(output, 'rb') as b:
+        assert a.read() == b.read()
+
+
+def test_journal_of_another_mapping_is_ignored(feed, tmp_path, fake_google):
+    output = str(tmp_path / 'out.xml')
+    job = make_job(feed, output)
+    stop_after(job, 2)
+    with pytest.raises(TranslationStopped):
+        job.run()
+
+    assert make_job(feed, output, FIELDS[:1]).run()['resumed_products'] == 0
+
+
+def test_no_resume_starts_over(feed, tmp_path, fake_google):
+    output = str(tmp_path / 'out.xml')
+    job = make_job(feed, output)
+    stop_after(job, 2)
+    with pytest.raises(TranslationStopped):
+        job.run()
+
+    assert make_job(feed, output, resume=False).run()['resumed_products'] == 0
+
+
+def test_torn_last_line_is_cut_before_appending(feed, tmp_path, fake_google):
+    output = str(tmp_path / 'out.xml')
+    job = make_job(feed, output)
+    stop_after(job, 2)
+    with pytest.raises(TranslationStopped):
+        job.run()
+    with open(output + '.journal', 'a', encoding='utf-8') as f:
+        f.write('{"type": "checkpoint", "prod')
+
+    job = make_job(feed, output)
+    stop_after(job, 4)
+    with pytest.raises(TranslationStopped):
+        job.run()
+    with open(output + '.journal', 'rb') as f:
+        lines = f.read().split(b'\n')
+    assert lines[-1] == b''
+    assert all(json.loads(line) for line in lines[:-1])
+
+    reference = str(tmp_path / 'reference.xml')
+    make_job(feed, reference, resume=False).run()
+    result = make_job(feed, output).run()
+    assert result['resumed_products'] == 20
+    with open(reference, 'rb') as a, open(output, 'rb') as b:
+        assert a.read() == b.read()
@@ -0,0 +1,64 @@
+import sqlite3
+import time
+
+from xml_translator_core import TranslationMemory
+
+
+def test_translations_are_visible_to_other_connections_right_away(tmp_path):
+    path = str(tmp_path / 'memory.db')
+    writer = TranslationMemory(path)
+    reader = TranslationMemory(path, evict_on_open=False)
+    try:
+        writer.put_many('local', 'en', 'de', {'shoe': 'Schuh', 'sock': 'Socke'})
+        assert reader.get('local', 'en', 'de', 'shoe') == 'Schuh'
+        # Neither connection keeps a write transaction open
+        reader.put('local', 'en', 'de', 'hat', 'Hut')
+        writer.evict()
+        assert writer.get('local', 'en', 'de', 'hat') == 'Hut'
+    finally:
+        writer.close()
+        reader.close()
+    assert reader.stats() == {'hits': 1, 'misses': 0, 'hit_rate': 1.0}
+
+
+def test_evict_keeps_the_newest_entries(tmp_path):
+    path = str(tmp_path / 'memory.db')
+    memory = TranslationMemory(path, max_entries=2)
+    for n in range(4):
+        memory.put('local', 'en', 'de', f'text {n}', f'Text {n}')
+    memory.close()
+
+    memory = TranslationMemory(path, max_entries=2, lru_size=0)
+    try:
+        assert [memory.get('local', 'en', 'de', f'text {n}') for n in range(4)] == [None, None, 'Text 2', 'Text 3']
+    finally:
+        memory.close()
+
+
+def test_entries_are_kept_per_backend(tmp_path):
+    memory = TranslationMemory(str(tmp_path / 'memory.db'))
+    try:
+        memory.put('local', 'en', 'de', 'shoe', '[de] shoe')
+        assert memory.get('google', 'en', 'de', 'shoe') is None
+        assert memory.get('local', 'en', 'de', 'shoe') == '[de] shoe'
+    finally:
+        memory.close()
+
+
+def test_entries_without_a_backend_are_dropped(tmp_path):
+    path = str(tmp_path / 'memory.db')
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE translations (source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, "
+                 "text TEXT NOT NULL, translation TEXT NOT NULL, created REAL NOT NULL, "
+                 "PRIMARY KEY (source_lang, target_lang, text))")
+    conn.execute("INSERT INTO translations VALUES ('en', 'de', 'shoe', '[de] shoe', ?)", (time.time(),))
+    conn.commit()
+    conn.close()
+
+    memory = TranslationMemory(path)
+    try:
+        assert memory.get('google', 'en', 'de', 'shoe') is None
+        memory.put('google', 'en', 'de', 'shoe', 'Schuh')
+        assert memory.get('google', 'en', 'de', 'shoe') == 'Schuh'
+    finally:
+        memory.close()
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+from conftest import FIELDS
+
+from xml_translator_core import ShardedJob, TranslationJob, TranslationStopped
+
+
+def make_job(feed, output):
+    job = TranslationJob(feed, output, FIELDS, 'en', 'de', requests_per_second=1e6, resume=False,
+                         backend='local')
+    job.window_size = 5
+    return job
+
+
+def test_metrics_file_is_written_after_a_run(feed, tmp_path):
+    job = make_job(feed, str(tmp_path / 'out.xml'))
+    result = job.run()
+    with open(result['metrics_file'], encoding='utf-8') as f:
+        metrics = json.load(f)
+    assert result['metrics_file'] == str(tmp_path / 'out.xml.metrics.json')
+    assert metrics['counters']['products'] == 40
+    assert metrics['api']['calls'] > 0
+    assert set(metrics['stages']) >= {'extract', 'translate', 'apply', 'serialize', 'parse'}
+
+
+def test_metrics_file_is_written_for_a_stopped_run(feed, tmp_path):
+    job = make_job(feed, str(tmp_path / 'out.xml'))
+    job.on_progress = lambda current, total, message: job.stop()
+    with pytest.raises(TranslationStopped):
+        job.run()
+    with open(job.metrics_file, encoding='utf-8') as f:
+        metrics = json.load(f)
+    assert metrics['counters']['products'] == 5
+
+
+def test_metrics_write_failure_is_a_notice(feed, tmp_path, capsys):
+    output = tmp_path / 'out.xml'
+    (tmp_path / 'out.xml.metrics.json').mkdir()
+    job = make_job(feed, str(output))
+    notices = []
+    job.on_notice = notices.append
+    assert job.run()['products'] == 40
+    assert len(notices) == 1 and notices[0].startswith('Could not write')
+    assert capsys.readouterr().out == ''
+
+
+def test_stopped_sharded_run_writes_one_metrics_file(feed, tmp_path):
+    output = tmp_path / 'out.xml'
+    job = ShardedJob(feed, {'de': str(output)}, FIELDS, 'en', requests_per_second=1e6, backend='local',
+                     backend_options={'latency': 0.5, 'max_batch': 1}, processes=2)
+    # The parts pick the stop up once they are running, long before their slow requests are done
+    job.stop()
+    with pytest.raises(TranslationStopped):
+        job.run()
+    with open(str(output) + '.metrics.json', encoding='utf-8') as f:
+        metrics = json.load(f)
+    assert metrics['api']['calls'] > 0
+    # The parts' own metrics files are folded into it
+    assert [path.name for path in tmp_path.glob('*.metrics.json')] == ['out.xml.metrics.json']
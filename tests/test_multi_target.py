@@ -0,0 +1,19 @@
+from conftest import FIELDS
+
+from xml_translator_core import MultiTargetJob, TranslationJob
+
+
+def test_multi_target_outputs_match_single_target_runs(feed, tmp_path):
+    outputs = {lang: str(tmp_path / f'multi_{lang}.xml') for lang in ('de', 'fr', 'it')}
+    job = MultiTargetJob(feed, outputs, FIELDS, 'en', requests_per_second=1e6, resume=False, backend='local')
+    job.window_size = 7
+    result = job.run()
+    assert result['products'] == 40
+    assert set(result['targets']) == set(outputs)
+
+    for lang, output in outputs.items():
+        single = str(tmp_path / f'single_{lang}.xml')
+        TranslationJob(feed, single, FIELDS, 'en', lang, requests_per_second=1e6, resume=False,
+                       backend='local').run()
+        with open(single, 'rb') as a, open(output, 'rb') as b:
+            assert a.read() == b.read()
@@ -0,0 +1,38 @@
+from xml_translator_core import RequestPlanner
+
+
+def test_split_keeps_segments_under_the_limit_and_joins_back():
+    text = '<p>First paragraph of the text.</p><p>Second one. It has two sentences.</p> and a long tail ' * 5
+    planner = RequestPlanner(max_chars=60)
+    segments = planner.split(text)
+    assert len(segments) > 1
+    assert all(len(segment) <= 60 for segment in segments)
+    assert ''.join(segments) == text
+    # Translators drop the whitespace around a text, join() puts it back
+    assert planner.join(segments, [segment.strip() for segment in segments]) == text
+
+
+def test_split_prefers_markup_then_sentence_boundaries():
+    planner = RequestPlanner(max_chars=40)
+    assert planner.split('<p>Short paragraph.</p><p>Another paragraph here.</p>')[0] == '<p>Short paragraph.</p>'
+    assert planner.split('One sentence here. Another sentence follows it.')[0] == 'One sentence here. '
+
+
+def test_join_keeps_the_whitespace_of_each_segment():
+    planner = RequestPlanner(max_chars=10)
+    assert planner.join(['Hello ', 'world'], ['Hallo', 'Welt']) == 'Hallo Welt'
+
+
+def test_short_strings_are_batched():
+    planner = RequestPlanner(max_chars=100, max_batch=2)
+    requests = planner.requests(['a', 'b', 'c'])
+    assert [payload for payload, groups in requests] == [['a', 'b'], ['c']]
+
+
+def test_short_strings_are_packed_without_a_batch_endpoint():
+    planner = RequestPlanner(max_chars=12, max_batch=1, delimiter='\n')
+    requests = planner.requests(['one', 'two', 'three', 'four'])
+    assert requests == [(['one\ntwo'], [['one', 'two']]), (['three\nfour'], [['three', 'four']])]
+    assert planner.unpack(['one', 'two'], 'eins\nzwei') == ['eins', 'zwei']
+    assert planner.unpack(['one', 'two'], 'eins zwei') is None
+    assert planner.requests(['one', 'two'], pack=False) == [(['one'], [['one']]), (['two'], [['two']])]
@@ -0,0 +1,44 @@
+from xml_translator_core import PreFilter, term_pattern
+
+
+def test_term_pattern_matches_whole_terms_longest_first():
+    pattern = term_pattern(['Pro', 'Pro Max', 'iPhone', 'iPad'])
+    assert pattern.findall('iPhone Pro Max and iPad Pro') == ['iPhone', 'Pro Max', 'iPad', 'Pro']
+    assert pattern.findall('Product iPhones') == []
+
+
+def test_term_pattern_ignore_case():
+    pattern = term_pattern(['gore-tex'], ignore_case=True)
+    assert pattern.findall('GORE-TEX and Gore-Tex') == ['GORE-TEX', 'Gore-Tex']
+    assert term_pattern([]) is None
+
+
+def test_skip_rules():
+    prefilter = PreFilter()
+    assert prefilter.skip_rule('ABC-123') == 'code'
+    assert prefilter.skip_rule('https://example.com/a') == 'url'
+    assert prefilter.skip_rule('2.5 kg') == 'measure'
+    assert prefilter.skip_rule('<br/>') == 'markup'
+    assert prefilter.skip_rule('Warm winter jacket') is None
+    assert PreFilter(rules=['url']).skip_rule('ABC-123') is None
+
+
+def test_protect_and_restore_glossary_terms():
+    prefilter = PreFilter('de', protect=['Acme'], terms={'running shoe': {'de': 'Laufschuh'}})
+    payload, terms = prefilter.protect('Acme running shoe for trails')
+    assert payload == '⟦0⟧ ⟦1⟧ for trails'
+    assert prefilter.needs_translation(payload)
+    assert prefilter.restore('⟦0⟧ ⟦1⟧ für Trails', terms) == 'Acme Laufschuh für Trails'
+    assert prefilter.restore('⟦ 1 ⟧ von ⟦0⟧', terms) == 'Laufschuh von Acme'
+
+
+def test_restore_reports_lost_placeholders():
+    prefilter = PreFilter('de', protect=['Acme'])
+    payload, terms = prefilter.protect('Acme socks')
+    assert prefilter.restore('Socken', terms) is None
+
+
+def test_values_made_of_terms_need_no_request():
+    prefilter = PreFilter('de', protect=['Acme'], terms={'Pro': 'Pro'})
+    payload, terms = prefilter.protect('Acme Pro 2')
+    assert not prefilter.needs_translation(payload)
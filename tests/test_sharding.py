@@ -0,0 +1,66 @@
+from conftest import FIELDS
+
+from xml_translator_core import ShardedJob, TranslationJob, merge_shards, split_feed, stream_products
+
+
+def copy_feed(source, out):
+    # Streams the feed through the engine without changing any product
+    return stream_products(source, out, lambda products, count: None, window_size=3)
+
+
+def test_split_feed_cuts_on_product_boundaries(feed):
+    with open(feed, 'rb') as f:
+        data = f.read()
+    shards = split_feed(feed, 4)
+    assert len(shards) == 4
+    assert [shard.index for shard in shards] == [0, 1, 2, 3]
+    for shard in shards:
+        assert data[shard.start:].startswith(b'<product ')
+    assert [shard.end for shard in shards[:-1]] == [shard.start for shard in shards[1:]]
+    assert data[:shards[-1].end].endswith(b'</product>')
+
+
+def test_feed_without_products_is_one_shard(tmp_path):
+    path = tmp_path / 'empty.xml'
+    path.write_bytes(b'<?xml version="1.0"?>\n<catalog><info>none</info></catalog>\n')
+    shards = split_feed(str(path), 4)
+    assert len(shards) == 1
+    assert (shards[0].start, shards[0].end) == (0, path.stat().st_size)
+
+
+def test_split_and_merge_round_trip(feed, tmp_path):
+    whole = tmp_path / 'whole.xml'
+    with open(feed, 'rb') as source, open(whole, 'wb') as out:
+        total = copy_feed(source, out)
+
+    shard_files = []
+    count = 0
+    for shard in split_feed(feed, 3):
+        shard_file = tmp_path / f'part{shard.index}.xml'
+        with shard.open() as source, open(shard_file, 'wb') as out:
+            count += copy_feed(source, out)
+        shard_files.append(str(shard_file))
+    merged = tmp_path / 'merged.xml'
+    with open(merged, 'wb') as out:
+        merge_shards(shard_files, out)
+
+    data = merged.read_bytes()
+    assert count == total == 40
+    assert data == whole.read_bytes()
+    assert data.count(b'<![CDATA[<p>Soft cotton &amp; linen') == 40
+    assert data.count(b'<!-- page break -->') == 4
+    assert b'<!-- exported feed -->' in data
+    assert b'_xml_translator_shard' not in data
+
+
+def test_sharded_job_output_matches_single_process(feed, tmp_path):
+    single = str(tmp_path / 'single.xml')
+    sharded = str(tmp_path / 'sharded.xml')
+    TranslationJob(feed, single, FIELDS, 'en', 'de', backend='local', requests_per_second=1e6,
+                   resume=False).run()
+    job = ShardedJob(feed, {'de': sharded}, FIELDS, 'en', backend='local', requests_per_second=1e6,
+                     resume=False, processes=2)
+    result = job.run()
+    assert result['products'] == 40
+    with open(single, 'rb') as a, open(sharded, 'rb') as b:
+        assert a.read() == b.read()
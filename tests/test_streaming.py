@@ -0,0 +1,33 @@
+from lxml import etree
+
+from xml_translator_core import TranslationJob
+
+FEED = b'''<?xml version="1.0" encoding="utf-8"?>
+<!DOCTYPE catalog SYSTEM "catalog.dtd">
+<catalog>
+<product id="1"><title>Fish &amp; chips</title><description><![CDATA[<p>Second para &amp; more</p>]]></description></product>
+<product id="2"><title>5 &lt; 10</title><description><![CDATA[5 &lt; 10]]></description></product>
+</catalog>
+'''
+
+
+def translate(tmp_path):
+    source = tmp_path / 'feed.xml'
+    source.write_bytes(FEED)
+    output = tmp_path / 'out.xml'
+    fields = [{'name': 'title', 'path': '/product/title'}, {'name': 'description', 'path': '/product/description'}]
+    TranslationJob(str(source), str(output), fields, 'en', 'de', backend='local', resume=False).run()
+    return output.read_bytes()
+
+
+def test_doctype_is_kept(tmp_path):
+    assert translate(tmp_path).startswith(b'<?xml version="1.0" encoding="utf-8"?>\n'
+                                          b'<!DOCTYPE catalog SYSTEM "catalog.dtd">\n<catalog>')
+
+
+def test_escaped_values_stay_escaped(tmp_path):
+    root = etree.fromstring(translate(tmp_path))
+    assert [(product.findtext('title'), product.findtext('description')) for product in root] == [
+        ('[de] Fish & chips', '[de] <p>Second para &amp; more</p>'),
+        ('[de] 5 < 10', '[de] 5 &lt; 10'),
+    ]
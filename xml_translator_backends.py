@@ -0,0 +1,267 @@
+"""Translation providers. A backend is picked by name with create_backend(); options are
+plain keyword arguments so they can come from the GUI, the command line or a config file."""
+import json
+import math
+import random
+import re
+import threading
+import time
+from collections import deque
+from html import unescape
+
+
+class BackendError(Exception):
+    pass
+
+
+class TransientError(BackendError):
+    """The request failed but may succeed when retried (timeout, connection reset, 5xx)."""
+
+
+class ConfigurationError(BackendError):
+    """The provider rejects every request of this job (bad key, URL or language)."""
+
+
+class ThrottledError(TransientError):
+    """The provider rejected the request for exceeding its rate limit (HTTP 429)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Exceptions of requests/urllib3/deep-translator that mean "try again later", matched by name
+# so the providers' libraries need not be importable here
+TRANSIENT_ERRORS = ('Timeout', 'ConnectTimeout', 'ReadTimeout', 'ConnectionError', 'ChunkedEncodingError',
+                    'RequestError', 'TooManyRequests')
+
+
+def is_transient(error):
+    if isinstance(error, (TransientError, TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in TRANSIENT_ERRORS for cls in type(error).__mro__)
+
+
+# Exceptions of requests/deep-translator for a key, URL or language that no request can succeed with
+CONFIGURATION_ERRORS = ('MissingSchema', 'InvalidSchema', 'InvalidURL', 'LanguageNotSupportedException',
+                        'InvalidSourceOrTargetLanguage', 'AuthorizationException', 'ApiKeyException')
+
+
+def is_configuration_error(error):
+    if isinstance(error, ConfigurationError):
+        return True
+    return any(cls.__name__ in CONFIGURATION_ERRORS for cls in type(error).__mro__)
+
+
+def is_throttled(error):
+    return isinstance(error, ThrottledError) or type(error).__name__ == 'TooManyRequests'
+
+
+ENTITY = re.compile(r'&(?:#[0-9]+|#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);')
+
+
+def decode_entities(text, translated):
+    # For providers that answer with HTML entities (&#39;, &quot;, &amp;); a text that
+    # already contained entities gets its translation back as is
+    if not translated or ENTITY.search(text):
+        return translated
+    return unescape(translated)
+
+
+def retry_after(value):
+    # Seconds from a Retry-After header, None when missing or given as a date
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+class TranslatorBackend:
+    """Base class of the translation providers.
+
+    Subclasses implement translate() and, when the provider has a real batch endpoint,
+    translate_batch(). The class attributes declare the provider's request limits."""
+
+    name = None
+    max_chars = 5000            # characters per request
+    max_batch = 1               # strings per request
+    requests_per_second = None  # provider limit, None when unknown
+    thread_safe = False         # one instance may be shared by all translation threads
+    pack_delimiter = None       # joins short strings into one request when there is no batch endpoint
+
+    def __init__(self, source_lang, target_lang, **options):
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        self.options = options
+
+    def translate(self, text):
+        raise NotImplementedError
+
+    def translate_batch(self, texts):
+        return [self.translate(text) for text in texts]
+
+    def requests_for(self, texts):
+        # Requests one translate_batch(texts) call costs against the rate limit
+        return max(1, math.ceil(len(texts) / self.max_batch))
+
+
+BACKENDS = {}
+
+
+def register_backend(cls):
+    BACKENDS[cls.name] = cls
+    return cls
+
+
+def create_backend(name, source_lang, target_lang, **options):
+    try:
+        cls = BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown translator backend {name!r}, available: {', '.join(sorted(BACKENDS))}")
+    return cls(source_lang, target_lang, **options)
+
+
+def parse_backend_options(items):
+    # ["latency=0.2", "url=http://mt:5000"] -> {'latency': 0.2, 'url': 'http://mt:5000'}
+    options = {}
+    for item in items:
+        key, sep, value = item.partition('=')
+        if not sep or not key.strip():
+            raise ValueError(f"expected key=value, got {item!r}")
+        value = value.strip()
+        try:
+            options[key.strip()] = json.loads(value)
+        except ValueError:
+            options[key.strip()] = value
+    return options
+
+
+@register_backend
+class GoogleBackend(TranslatorBackend):
+    name = 'google'
+    max_chars = 4999  # deep-translator rejects 5000 characters and more
+    pack_delimiter = '\n'  # translation keys never contain newlines
+
+    def __init__(self, source_lang, target_lang, **options):
+        super().__init__(source_lang, target_lang, **options)
+        from deep_translator import GoogleTranslator
+        self._translator = GoogleTranslator(source=source_lang, target=target_lang)
+
+    def translate(self, text):
+        return decode_entities(text, self._translator.translate(text))
+
+    def translate_batch(self, texts):
+        return [decode_entities(text, translated)
+                for text, translated in zip(texts, self._translator.translate_batch(texts))]
+
+
+@register_backend
+class LibreTranslateBackend(TranslatorBackend):
+    """LibreTranslate-compatible server (self-hosted or internal MT), options: url, api_key, timeout."""
+
+    name = 'libretranslate'
+    max_chars = 10000
+    max_batch = 50
+    thread_safe = True
+
+    def __init__(self, source_lang, target_lang, url='http://localhost:5000', api_key=None, timeout=30, **options):
+        super().__init__(source_lang, target_lang, **options)
+        import requests
+        self._session = requests.Session()
+        self.url = url.rstrip('/') + '/translate'
+        self.api_key = api_key
+        self.timeout = timeout
+
+    def translate(self, text):
+        return self.translate_batch([text])[0]
+
+    def translate_batch(self, texts):
+        payload = {'q': list(texts), 'source': self.source_lang, 'target': self.target_lang, 'format': 'text'}
+        if self.api_key:
+            payload['api_key'] = self.api_key
+        response = self._session.post(self.url, json=payload, timeout=self.timeout)
+        if response.status_code == 429:
+            raise ThrottledError(f"{self.url} returned 429: {response.text[:200]}",
+                                 retry_after(response.headers.get('Retry-After')))
+        if response.status_code >= 500:
+            raise TransientError(f"{self.url} returned {response.status_code}: {response.text[:200]}")
+        # A rejected key, a wrong URL or an unsupported language; other 4xx concern this payload only
+        if response.status_code in (401, 403, 404) or (response.status_code == 400
+                                                       and 'not supported' in response.text):
+            raise ConfigurationError(f"{self.url} returned {response.status_code}: {response.text[:200]}")
+        if response.status_code != 200:
+            raise BackendError(f"{self.url} returned {response.status_code}: {response.text[:200]}")
+        translated = response.json()['translatedText']
+        return translated if isinstance(translated, list) else [translated]
+
+
+@register_backend
+class LocalBackend(TranslatorBackend):
+    """Deterministic offline stand-in for load tests: returns "[target] text".
+
+    Options: latency (seconds per request), jitter (seconds, uniform), failure_rate
+    (fraction of requests raising TransientError), limit (requests per second accepted,
+    more are rejected with ThrottledError like an HTTP 429), seed, max_batch, max_chars,
+    requests_per_second, pack_delimiter (with max_batch=1, to behave like a provider
+    without a batch endpoint)."""
+
+    name = 'local'
+    max_batch = 50
+    thread_safe = True
+
+    def __init__(self, source_lang, target_lang, latency=0.0, jitter=0.0, failure_rate=0.0, limit=None, seed=0,
+                 max_batch=None, max_chars=None, requests_per_second=None, pack_delimiter=None, **options):
+        super().__init__(source_lang, target_lang, **options)
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.limit = limit
+        self._accepted = deque()
+        if max_batch:
+            self.max_batch = max_batch
+        if max_chars:
+            self.max_chars = max_chars
+        if requests_per_second:
+            self.requests_per_second = requests_per_second
+        if pack_delimiter:
+            self.pack_delimiter = pack_delimiter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.throttled = 0
+
+    def _request(self):
+        # Returns the simulated latency of one request, raising for injected failures
+        with self._lock:
+            self.requests += 1
+            if self.limit:
+                now = time.monotonic()
+                while self._accepted and self._accepted[0] <= now - 1.0:
+                    self._accepted.popleft()
+                if len(self._accepted) >= self.limit:
+                    self.throttled += 1
+                    raise ThrottledError(f"More than {self.limit} requests per second",
+                                         self._accepted[0] + 1.0 - now)
+                self._accepted.append(now)
+            delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+            failed = self.failure_rate and self._random.random() < self.failure_rate
+        if failed:
+            raise TransientError("Injected failure")
+        return delay
+
+    def _translate(self, text):
+        if len(text) > self.max_chars:
+            raise BackendError(f"Text of {len(text)} characters exceeds the {self.max_chars} character limit")
+        return f"[{self.target_lang}] {text}"
+
+    def translate(self, text):
+        return self.translate_batch([text])[0]
+
+    def translate_batch(self, texts):
+        results = []
+        for start in range(0, len(texts), self.max_batch):
+            delay = self._request()
+            if delay:
+                time.sleep(delay)
+            results.extend(self._translate(text) for text in texts[start:start + self.max_batch])
+        return results
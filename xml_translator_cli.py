@@ -0,0 +1,208 @@
+"""Headless runner: detect field mappings and translate directories of feeds without Qt.
+
+    python xml_translator_cli.py detect feed.xml -o mapping.json
+    python xml_translator_cli.py translate feeds/ -m mapping.json -l en:ro -l en:de -o out/ --jobs 4
+
+translate prints one JSON object per finished file and a final totals object. Target
+languages of the same source are translated in a single pass over each feed.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from xml_translator_backends import BACKENDS, parse_backend_options
+from xml_translator_core import (DEFAULT_MEMORY_PATH, ShardedJob, TranslationMemory, detect_fields,
+                                 load_field_mapping, load_prefilter_config, save_field_mapping)
+
+
+def parse_lang_pair(value):
+    source, sep, target = value.partition(':')
+    if not sep or not source or not target:
+        raise argparse.ArgumentTypeError(f"expected SOURCE:TARGET, got {value!r}")
+    return source, target
+
+
+def find_feeds(path):
+    if os.path.isfile(path):
+        return [path]
+    return sorted(os.path.join(path, name) for name in os.listdir(path)
+                  if name.lower().endswith('.xml') and os.path.isfile(os.path.join(path, name)))
+
+
+def output_path_for(output_dir, input_file, target_lang, per_language_dirs):
+    filename = f"translated_{os.path.basename(input_file)}"
+    if per_language_dirs:
+        return os.path.join(output_dir, target_lang, filename)
+    return os.path.join(output_dir, filename)
+
+
+def report_notice(input_file, message):
+    # stdout carries the JSON lines only
+    print(f"{input_file}: {message}", file=sys.stderr, flush=True)
+
+
+def translate_file(input_file, outputs, field_mapping, source_lang, options):
+    # Runs in a pool process; outputs maps target languages to output files, several targets
+    # are translated in one pass over the feed. Returns one summary per target.
+    for output_file in outputs.values():
+        os.makedirs(os.path.dirname(os.path.abspath(output_file)), exist_ok=True)
+    summaries = {target_lang: {
+        'input': input_file,
+        'output': output_file,
+        'source_lang': source_lang,
+        'target_lang': target_lang,
+    } for target_lang, output_file in outputs.items()}
+    started = time.monotonic()
+    memory = None
+    try:
+        if options['memory']:
+            # cmd_translate has evicted the memory before starting the pool
+            memory = TranslationMemory(options['memory'], evict_on_open=False)
+        job = ShardedJob(input_file, outputs, field_mapping, source_lang, memory=memory,
+                         concurrency=options['concurrency'], requests_per_second=options['rate'],
+                         resume=options['resume'], delta=options['delta'], id_field=options['id_field'],
+                         backend=options['backend'], backend_options=options['backend_options'],
+                         processes=options['shards'], prefilter=options['prefilter'])
+        job.on_notice = lambda message: report_notice(input_file, message)
+        result = job.run()
+        results = result['targets'] if len(outputs) > 1 else {next(iter(outputs)): result}
+        for target_lang, result in results.items():
+            summaries[target_lang].update(ok=True, products=result['products'], fields=result['fields'],
+                                          resumed_products=result['resumed_products'],
+                                          unchanged_products=result['unchanged_products'],
+                                          untranslated=result['untranslated'],
+                                          saved_calls=result['metrics']['counters'].get('prefilter_saved_calls', 0),
+                                          memory=result['memory'],
+                                          metrics_file=result['metrics_file'])
+    except Exception as e:
+        for summary in summaries.values():
+            summary.update(ok=False, error=str(e))
+    finally:
+        if memory:
+            memory.close()
+    elapsed = round(time.monotonic() - started, 3)
+    for summary in summaries.values():
+        summary['elapsed'] = elapsed
+    return list(summaries.values())
+
+
+def cmd_detect(args):
+    fields = detect_fields(args.feed, args.max_products, args.time_budget)
+    if not fields:
+        print(f"No fields detected in {args.feed}", file=sys.stderr)
+        return 1
+    if args.output:
+        save_field_mapping(args.output, fields)
+    else:
+        json.dump(fields, sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    return 0
+
+
+def cmd_translate(args):
+    field_mapping = load_field_mapping(args.mapping)
+    feeds = find_feeds(args.input)
+    if not feeds:
+        print(f"No XML feeds found in {args.input}", file=sys.stderr)
+        return 1
+
+    options = {
+        'memory': None if args.no_memory else args.memory,
+        'concurrency': args.concurrency,
+        'rate': args.rate,
+        'resume': not args.no_resume,
+        'delta': args.delta,
+        'id_field': args.id_field,
+        'backend': args.backend,
+        'backend_options': parse_backend_options(args.backend_option),
+        'shards': args.shards,
+        'prefilter': load_prefilter_config(args.prefilter) if args.prefilter else None,
+    }
+    if options['memory']:
+        # Evicted once here; the pool processes share the file and only write in short transactions
+        TranslationMemory(options['memory']).close()
+    per_language_dirs = len(args.lang) > 1
+    # Targets sharing a source language are translated in one pass over each feed
+    targets = {}
+    for source, target in args.lang:
+        targets.setdefault(source, []).append(target)
+    tasks = [(feed, {target: output_path_for(args.output_dir, feed, target, per_language_dirs)
+                     for target in target_langs}, source)
+             for feed in feeds for source, target_langs in targets.items()]
+
+    started = time.monotonic()
+    totals = {'files': sum(len(outputs) for _, outputs, _ in tasks), 'failed': 0, 'products': 0, 'fields': 0,
+              'untranslated': 0, 'saved_calls': 0}
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(translate_file, feed, outputs, field_mapping, source, options)
+                   for feed, outputs, source in tasks]
+        for future in as_completed(futures):
+            for summary in future.result():
+                print(json.dumps(summary, ensure_ascii=False), flush=True)
+                if summary['ok']:
+                    totals['products'] += summary['products']
+                    totals['fields'] += summary['fields']
+                    totals['untranslated'] += summary['untranslated']
+                    totals['saved_calls'] += summary['saved_calls']
+                else:
+                    totals['failed'] += 1
+
+    totals['elapsed'] = round(time.monotonic() - started, 3)
+    print(json.dumps({'totals': totals}), flush=True)
+    return 1 if totals['failed'] else 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Translate selected fields of XML product feeds")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    detect = commands.add_parser('detect', help="detect the translatable fields of a feed")
+    detect.add_argument('feed')
+    detect.add_argument('-o', '--output', help="write the field mapping to this file instead of stdout")
+    detect.add_argument('--max-products', type=int, default=500, help="products sampled for fields")
+    detect.add_argument('--time-budget', type=float, default=1.0, help="stop sampling after this many seconds")
+    detect.set_defaults(func=cmd_detect)
+
+    translate = commands.add_parser('translate', help="translate a feed or a directory of feeds")
+    translate.add_argument('input', help="XML file or directory of XML files")
+    translate.add_argument('-m', '--mapping', required=True, help="field mapping file (from detect or the GUI)")
+    translate.add_argument('-l', '--lang', required=True, action='append', type=parse_lang_pair,
+                           metavar='SOURCE:TARGET', help="language pair, may be repeated")
+    translate.add_argument('-o', '--output-dir', required=True)
+    translate.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                           help="files translated in parallel (processes)")
+    translate.add_argument('--shards', type=int, default=1,
+                           help="split each feed on product boundaries and translate the parts in this many "
+                                "processes (for large feeds, on top of --jobs)")
+    translate.add_argument('--backend', default='google', choices=sorted(BACKENDS), help="translation provider")
+    translate.add_argument('--backend-option', action='append', default=[], metavar='KEY=VALUE',
+                           help="backend option, may be repeated (e.g. url=http://mt:5000, latency=0.1)")
+    translate.add_argument('--concurrency', type=int, default=4, help="parallel requests per file")
+    translate.add_argument('--rate', type=float, default=5.0,
+                           help="maximum requests per second per file, lowered while the translator throttles")
+    translate.add_argument('--prefilter', metavar='FILE',
+                           help="JSON file with do-not-translate rules and glossary terms (rules, patterns, "
+                                "protect, terms, ignore_case)")
+    translate.add_argument('--memory', default=DEFAULT_MEMORY_PATH, help="translation memory database")
+    translate.add_argument('--no-memory', action='store_true', help="do not use the persistent translation memory")
+    translate.add_argument('--no-resume', action='store_true',
+                           help="ignore the checkpoint journal of an interrupted run and start over")
+    translate.add_argument('--delta', action='store_true',
+                           help="only translate products that are new or changed since the last run "
+                                "(state kept in <output>.delta.db)")
+    translate.add_argument('--id-field', help="product id for --delta: a child tag name or @attribute "
+                                              "(default: @id, then id/sku/code/product_id)")
+    translate.set_defaults(func=cmd_translate)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,2495 @@
+"""Translation pipeline shared by the GUI and the command line runner. Must not import Qt."""
+from lxml import etree
+from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from queue import Empty
+from xml.sax.saxutils import escape
+import multiprocessing
+import threading
+import sqlite3
+import hashlib
+import json
+import time
+import re
+import os
+import random
+import mmap
+
+from xml_translator_backends import (BACKENDS, BackendError, create_backend, is_configuration_error, is_throttled,
+                                    is_transient)
+
+
+DEFAULT_MEMORY_PATH = os.path.join(os.path.expanduser('~'), '.xml_translator', 'translation_memory.db')
+# Write buffer of the translated output; serialized products are small, this batches them into few syscalls
+OUTPUT_BUFFER_SIZE = 1024 * 1024
+
+
+def normalize_text(text):
+    return ' '.join(text.split())
+
+
+def restore_whitespace(original, translated):
+    # Re-apply the leading/trailing whitespace of the original text
+    leading = original[:len(original) - len(original.lstrip())]
+    trailing = original[len(original.rstrip()):]
+    return leading + translated + trailing
+
+
+def local_name(elem):
+    tag = elem.tag
+    return tag.rsplit('}', 1)[-1] if tag[0] == '{' else tag
+
+
+def is_product(elem):
+    tag = elem.tag
+    return isinstance(tag, str) and (tag == 'product' or tag.endswith('}product'))
+
+
+def element_string(elem):
+    # Like BeautifulSoup's .string: the text of an element without child elements
+    return elem.text if len(elem) == 0 else None
+
+
+_namespace_declarations = {}
+
+
+def strip_inherited_namespaces(data, elem):
+    # lxml repeats the namespace declarations on serialized subtrees, the ancestors
+    # written before them already carry these
+    parent = elem.getparent()
+    nsmap = elem.nsmap
+    if not nsmap or parent is None or nsmap != parent.nsmap:
+        return data
+    key = tuple(nsmap.items())
+    decl = _namespace_declarations.get(key)
+    if decl is None:
+        decl = etree.tostring(etree.Element('x', nsmap=nsmap), encoding='utf-8')[2:-2]
+        _namespace_declarations[key] = decl
+    if 0 < data.find(decl) < data.find(b'>'):
+        data = data.replace(decl, b'', 1)
+    return data
+
+
+def serialize(elem, with_tail=False):
+    data = etree.tostring(elem, encoding='utf-8', with_tail=with_tail)
+    if isinstance(elem.tag, str):
+        data = strip_inherited_namespaces(data, elem)
+    return data
+
+
+def start_tag(elem):
+    shallow = etree.Element(elem.tag, attrib=dict(elem.attrib), nsmap=elem.nsmap)
+    return strip_inherited_namespaces(etree.tostring(shallow, encoding='utf-8')[:-2] + b'>', elem)
+
+
+def end_tag(elem):
+    name = local_name(elem)
+    if elem.prefix:
+        name = f"{elem.prefix}:{name}"
+    return f"</{name}>".encode('utf-8')
+
+
+def replace_file(out, target):
+    # Syncs and closes the fully written file `out`, then moves it over `target`: readers see
+    # either the previous file or the complete new one, never a truncated write
+    out.flush()
+    os.fsync(out.fileno())
+    out.close()
+    os.replace(out.name, target)
+    # The rename itself is durable once its directory is synced (not possible on Windows)
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(target)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def text_value(original, text):
+    # Markup fragments (usually CDATA descriptions) stay CDATA
+    if '<' in original:
+        try:
+            return etree.CDATA(text)
+        except ValueError:
+            pass
+    return text
+
+
+def iter_products(input_file):
+    # Yields <product> elements as soon as they are fully parsed, each one is freed when
+    # the next is requested; closing the generator stops parsing
+    with open(input_file, 'rb') as f:
+        for _, elem in etree.iterparse(f, events=('end',), tag=('{*}product', 'product'),
+                                       huge_tree=True, strip_cdata=False):
+            yield elem
+            elem.clear()
+            parent = elem.getparent()
+            if parent is not None:
+                while elem.getprevious() is not None:
+                    del parent[0]
+
+
+PRODUCT_START = re.compile(rb'<(?:[A-Za-z_][\w.-]*:)?product[\s/>]')
+PRODUCT_END = re.compile(rb'</(?:[A-Za-z_][\w.-]*:)?product\s*>')
+# Empty elements that mark where a shard's own products start and end in its output
+SHARD_START = b'<_xml_translator_shard_start/>'
+SHARD_END = b'<_xml_translator_shard_end/>'
+
+
+def _inside_markup(data, pos):
+    # True when pos lies in a CDATA section or a comment, where '<product' is only text
+    for opening, closing in ((b'<![CDATA[', b']]>'), (b'<!--', b'-->')):
+        start = data.rfind(opening, 0, pos)
+        if start != -1 and data.find(closing, start, pos) == -1:
+            return True
+    return False
+
+
+def _product_start(data, pos, end):
+    while True:
+        match = PRODUCT_START.search(data, pos, end)
+        if match is None or not _inside_markup(data, match.start()):
+            return match.start() if match else None
+        pos = match.end()
+
+
+def _last_product_end(data, size):
+    pos = size
+    while True:
+        pos = data.rfind(b'product', 0, pos)
+        if pos == -1:
+            return None
+        start = data.rfind(b'</', 0, pos)
+        match = PRODUCT_END.match(data, start) if start != -1 else None
+        if match and match.end() > pos and not _inside_markup(data, start):
+            return match.end()
+
+
+class _ShardReader:
+    # Binary file-like object reading a list of parts: (start, end) ranges of a file and bytes
+    def __init__(self, path, parts):
+        self._file = open(path, 'rb')
+        self._parts = parts
+        self._part = 0
+        self._offset = 0
+        self._position = 0
+
+    def read(self, size=-1):
+        chunks = []
+        while self._part < len(self._parts) and size != 0:
+            part = self._parts[self._part]
+            if isinstance(part, bytes):
+                length = len(part) - self._offset
+                if size > 0:
+                    length = min(length, size)
+                data = part[self._offset:self._offset + length]
+            else:
+                start, end = part
+                length = end - start - self._offset
+                if size > 0:
+                    length = min(length, size)
+                self._file.seek(start + self._offset)
+                data = self._file.read(length)
+            if not data:
+                self._part += 1
+                self._offset = 0
+                continue
+            self._offset += len(data)
+            if size > 0:
+                size -= len(data)
+            chunks.append(data)
+        data = b''.join(chunks)
+        self._position += len(data)
+        return data
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class FeedShard:
+    """Products [start, end) of a feed, as a document of its own: the feed's bytes up to
+    the first product, the range, and the bytes after the last product. Every shard but the
+    first has SHARD_START before its products, every shard but the last SHARD_END after
+    them; merge_shards() cuts the translated shards there."""
+
+    def __init__(self, path, index, count, start, end, header_end, footer_start):
+        self.path = path
+        self.index = index
+        self.count = count
+        self.start = start
+        self.end = end
+        self.header_end = header_end
+        self.footer_start = footer_start
+
+    def parts(self):
+        footer_end = os.path.getsize(self.path)
+        parts = [(0, self.header_end)]
+        if self.index > 0:
+            parts.append(SHARD_START)
+        parts.append((self.start, self.end))
+        if self.index < self.count - 1:
+            parts.append(SHARD_END)
+        parts.append((self.footer_start, footer_end))
+        return parts
+
+    def open(self):
+        return _ShardReader(self.path, self.parts())
+
+    def size(self):
+        return sum(len(part) if isinstance(part, bytes) else part[1] - part[0] for part in self.parts())
+
+    def describe(self):
+        return {'index': self.index, 'count': self.count, 'start': self.start, 'end': self.end}
+
+
+def split_feed(path, count):
+    """Split a feed into at most `count` FeedShards of about the same size, on <product>
+    boundaries. Returns fewer shards (or one) when the feed has too few products or its
+    products cannot be located from the bytes alone."""
+    size = os.path.getsize(path)
+    if count < 2 or size == 0:
+        return [FeedShard(path, 0, 1, 0, size, 0, size)]
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        first = _product_start(data, 0, size)
+        footer_start = _last_product_end(data, size)
+        if first is None or footer_start is None or footer_start <= first \
+                or _product_start(data, footer_start, size) is not None:
+            return [FeedShard(path, 0, 1, 0, size, 0, size)]
+        bounds = [first]
+        for k in range(1, count):
+            target = first + (footer_start - first) * k // count
+            pos = _product_start(data, max(target, bounds[-1] + 1), footer_start)
+            if pos is None:
+                break
+            if pos > bounds[-1]:
+                bounds.append(pos)
+    bounds.append(footer_start)
+    if len(bounds) < 3:
+        return [FeedShard(path, 0, 1, 0, size, 0, size)]
+    n = len(bounds) - 1
+    return [FeedShard(path, k, n, bounds[k], bounds[k + 1], first, footer_start) for k in range(n)]
+
+
+def merge_shards(shard_files, out):
+    # Writes the products of each translated shard, with the document around them taken
+    # from the first and last shard, to out
+    last = len(shard_files) - 1
+    for k, shard_file in enumerate(shard_files):
+        with open(shard_file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            start, end = 0, len(data)
+            if k > 0:
+                start = data.find(SHARD_START[:-2])
+                start = data.find(b'>', start) + 1 if start != -1 else -1
+            if k < last:
+                end = data.rfind(SHARD_END[:-2])
+            if start == -1 or end == -1 or end < start:
+                raise ValueError(f"{shard_file} has no shard markers")
+            for pos in range(start, end, OUTPUT_BUFFER_SIZE):
+                out.write(data[pos:min(end, pos + OUTPUT_BUFFER_SIZE)])
+
+
+class _Frame:
+    __slots__ = ('elem', 'opened', 'last')
+
+    def __init__(self, elem):
+        self.elem = elem
+        self.opened = False
+        self.last = None
+
+
+def stream_products(source, out, process_window, window_size=200, on_flushed=None, metrics=None, render=None):
+    """Copy the binary stream source to out, handing <product> elements to
+    process_window in windows of window_size and freeing them once written.
+    on_flushed(count) is called each time everything up to product `count` is written.
+
+    out may also be a list of streams that all receive the document; render(product)
+    then returns the serialized product for each of them."""
+    outs = out if isinstance(out, (list, tuple)) else [out]
+    stack = []
+    queue = [('bytes', b'<?xml version="1.0" encoding="utf-8"?>\n')]
+    window = []
+    product = None
+    count = 0
+
+    def write_pending_tail(frame):
+        if frame.last is not None:
+            queue.append(('tail', frame.last))
+            frame.last = None
+
+    def open_frames(path_child):
+        for n, frame in enumerate(stack):
+            if frame.opened:
+                continue
+            elem = frame.elem
+            queue.append(('bytes', start_tag(elem) + escape(elem.text or '').encode('utf-8')))
+            stop_at = stack[n + 1].elem if n + 1 < len(stack) else path_child
+            for child in elem:
+                if child is stop_at:
+                    break
+                queue.append(('bytes', serialize(child, with_tail=True)))
+            frame.opened = True
+
+    def flush():
+        for kind, value in queue:
+            if kind == 'bytes':
+                for stream in outs:
+                    stream.write(value)
+            elif kind == 'product':
+                if render:
+                    for stream, data in zip(outs, render(value)):
+                        stream.write(data)
+                else:
+                    out.write(serialize(value))
+                value.clear(keep_tail=True)
+            elif kind == 'tail':
+                if value.tail:
+                    data = escape(value.tail).encode('utf-8')
+                    for stream in outs:
+                        stream.write(data)
+                parent = value.getparent()
+                if parent is not None:
+                    parent.remove(value)
+        queue.clear()
+
+    def process():
+        if window:
+            process_window(window, count)
+            window.clear()
+        if metrics:
+            with metrics.stage('serialize'):
+                flush()
+        else:
+            flush()
+        if on_flushed:
+            on_flushed(count)
+
+    for event, elem in etree.iterparse(source, events=('start', 'end', 'comment', 'pi'),
+                                       huge_tree=True, strip_cdata=False):
+        if product is not None:
+            if event == 'end' and elem is product:
+                count += 1
+                window.append(elem)
+                queue.append(('product', elem))
+                stack[-1].last = elem
+                product = None
+                if len(window) >= window_size:
+                    process()
+            continue
+
+        if event == 'start':
+            if not stack:
+                # The root: the prolog is parsed, write its document type after the declaration
+                doctype = elem.getroottree().docinfo.doctype
+                if doctype:
+                    queue.insert(1, ('bytes', doctype.encode('utf-8') + b'\n'))
+            if stack and stack[-1].opened:
+                write_pending_tail(stack[-1])
+            if is_product(elem) and stack:
+                open_frames(elem)
+                product = elem
+            else:
+                stack.append(_Frame(elem))
+
+        elif event == 'end':
+            frame = stack.pop()
+            if frame.opened:
+                write_pending_tail(frame)
+                queue.append(('bytes', end_tag(elem)))
+                if stack:
+                    stack[-1].last = elem
+            elif not stack or stack[-1].opened:
+                queue.append(('bytes', serialize(elem)))
+                if stack:
+                    stack[-1].last = elem
+            if not stack:
+                queue.append(('bytes', b'\n'))
+
+        else:
+            # Comments and processing instructions outside of products
+            parent = elem.getparent()
+            if parent is None:
+                if not stack:
+                    queue.append(('bytes', serialize(elem) + b'\n'))
+            elif stack and stack[-1].elem is parent and stack[-1].opened:
+                write_pending_tail(stack[-1])
+                queue.append(('bytes', serialize(elem)))
+                stack[-1].last = elem
+
+    process()
+    return count
+
+
+class RateLimiter:
+    """Token bucket shared by all translation threads."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def acquire(self, tokens=1, should_continue=None):
+        # Reserve the tokens (the balance may go negative) and sleep until they are paid off.
+        # Returns False if should_continue() turned false while waiting.
+        with self._lock:
+            self._refill()
+            self._tokens -= tokens
+            delay = -self._tokens / self.rate if self._tokens < 0 else 0
+
+        deadline = time.monotonic() + delay
+        while True:
+            if should_continue and not should_continue():
+                return False
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            time.sleep(min(remaining, 0.1))
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """RateLimiter that follows the provider's real limit: while requests succeed the
+    rate grows by `increase` requests/s every second, when the provider throttles it is
+    cut by `decrease` (AIMD), staying between min_rate and max_rate."""
+
+    def __init__(self, max_rate, min_rate=0.2, increase=None, decrease=0.5):
+        super().__init__(max_rate)
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.increase = increase if increase is not None else max(0.1, max_rate / 20)
+        self.decrease = decrease
+        self._last_cut = 0.0
+        self._last_increase = time.monotonic()
+
+    def _set_rate(self, rate):
+        self._refill()
+        self.rate = rate
+        self.burst = max(1.0, rate)
+        self._tokens = min(self._tokens, self.burst)
+
+    def succeeded(self):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate < self.max_rate:
+                # At most one second of growth per success, so an idle pause does not jump to max_rate
+                grown = self.increase * min(1.0, now - self._last_increase)
+                self._set_rate(min(self.max_rate, self.rate + grown))
+            self._last_increase = now
+
+    def throttled(self):
+        # Requests already in flight fail together; cut once per second at most
+        with self._lock:
+            now = time.monotonic()
+            if now - self._last_cut < 1.0:
+                return
+            self._last_cut = now
+            self._last_increase = now
+            self._set_rate(max(self.min_rate, self.rate * self.decrease))
+            self._tokens = min(self._tokens, 0.0)
+
+
+class CircuitBreaker:
+    """Counts consecutive failed requests. After `threshold` of them the circuit opens
+    for a cool-down that doubles (up to max_cooldown) while the provider keeps failing;
+    the first request after a cool-down decides whether it closes again."""
+
+    def __init__(self, threshold=5, cooldown=30.0, max_cooldown=300.0):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.failures = 0
+        self.opened = 0
+        self._open_until = 0.0
+        self._lock = threading.Lock()
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened = 0
+
+    def failure(self):
+        # Returns the cool-down in seconds when this failure opens the circuit, else None
+        with self._lock:
+            self.failures += 1
+            if self.failures < self.threshold or time.monotonic() < self._open_until:
+                return None
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** self.opened)
+            self.opened += 1
+            self.failures = self.threshold - 1  # a failing probe opens it again
+            self._open_until = time.monotonic() + cooldown
+            return cooldown
+
+
+class RunMetrics:
+    """Per-run instrumentation: wall time per stage, counters, translation call latency
+    histogram and errors. Safe to update from the translation threads."""
+
+    LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.elapsed = None
+        self.stages = {}
+        self.counters = {}
+        self.gauges = {}
+        self.errors = {}
+        self.calls = 0
+        self.call_strings = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+        self.latency_counts = [0] * (len(self.LATENCY_BUCKETS) + 1)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - started)
+
+    def add_time(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set_gauge(self, name, value):
+        self.gauges[name] = value
+
+    def add(self, summary, stages=True, skip=(), label=None):
+        # Adds the counts of another run's to_dict() summary (a shard, a target language)
+        with self._lock:
+            if stages:
+                for name, seconds in summary['stages'].items():
+                    self.stages[name] = self.stages.get(name, 0.0) + seconds
+            for name, value in summary['counters'].items():
+                if name not in skip:
+                    self.counters[name] = self.counters.get(name, 0) + value
+            for name, value in summary['gauges'].items():
+                self.gauges[f"{name} ({label})" if label else name] = value
+            api = summary['api']
+            self.calls += api['calls']
+            self.call_strings += api['strings']
+            self.latency_total += (api['latency']['mean'] or 0.0) * api['calls']
+            self.latency_max = max(self.latency_max, api['latency']['max'])
+            self.latency_counts = [a + b for a, b in zip(self.latency_counts, api['latency']['histogram'].values())]
+            for name, count in summary['errors'].items():
+                self.errors[name] = self.errors.get(name, 0) + count
+
+    def record_call(self, seconds, strings, error=None):
+        with self._lock:
+            self.calls += 1
+            self.call_strings += strings
+            self.latency_total += seconds
+            self.latency_max = max(self.latency_max, seconds)
+            bucket = 0
+            while bucket < len(self.LATENCY_BUCKETS) and seconds > self.LATENCY_BUCKETS[bucket]:
+                bucket += 1
+            self.latency_counts[bucket] += 1
+            if error is not None:
+                name = type(error).__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def latency_percentile(self, q):
+        # Upper bound of the histogram bucket holding the q-th percentile
+        if not self.calls:
+            return None
+        rank = q * self.calls
+        seen = 0
+        for bound, count in zip(self.LATENCY_BUCKETS + (self.latency_max,), self.latency_counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.latency_max)
+        return self.latency_max
+
+    def finish(self):
+        self.elapsed = time.monotonic() - self.started
+
+    @staticmethod
+    def _rounded(seconds):
+        return None if seconds is None else round(seconds, 4)
+
+    def to_dict(self):
+        with self._lock:
+            elapsed = self.elapsed if self.elapsed is not None else time.monotonic() - self.started
+            counters = dict(self.counters)
+            labels = [f"<={bound}s" for bound in self.LATENCY_BUCKETS] + [f">{self.LATENCY_BUCKETS[-1]}s"]
+            return {
+                'elapsed': round(elapsed, 3),
+                'stages': {name: round(seconds, 3) for name, seconds in self.stages.items()},
+                'counters': counters,
+                'gauges': dict(self.gauges),
+                'throughput': {
+                    'products_per_second': round(counters.get('products', 0) / elapsed, 2) if elapsed else 0.0,
+                    'strings_per_second': round(counters.get('fields', 0) / elapsed, 2) if elapsed else 0.0,
+                },
+                'api': {
+                    'calls': self.calls,
+                    'strings': self.call_strings,
+                    'errors': sum(self.errors.values()),
+                    'latency': {
+                        'mean': round(self.latency_total / self.calls, 4) if self.calls else None,
+                        'p50': self._rounded(self.latency_percentile(0.5)),
+                        'p95': self._rounded(self.latency_percentile(0.95)),
+                        'max': round(self.latency_max, 4),
+                        'histogram': dict(zip(labels, self.latency_counts)),
+                    },
+                },
+                'errors': dict(self.errors),
+            }
+
+    def write(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+
+class RequestPlanner:
+    """Turns the strings of a window into provider-sized requests.
+
+    Strings longer than the provider allows are split at markup, sentence or word
+    boundaries and joined again after translation. Short strings share requests: as
+    items of one batch call, or, for providers without a batch endpoint, packed into a
+    single text separated by the backend's delimiter."""
+
+    # Cut points for oversized strings, preferred first
+    BOUNDARIES = (
+        re.compile(r'(?:</(?:p|div|li|ul|ol|h[1-6]|tr|table|section)>|<br\s*/?>)\s*', re.IGNORECASE),
+        re.compile(r'[.!?;:\u3002](?:["\')\]]*)\s+'),
+        re.compile(r'\s+'),
+    )
+
+    def __init__(self, max_chars, max_batch=1, delimiter=None):
+        self.max_chars = max_chars
+        self.max_batch = max_batch
+        self.delimiter = delimiter
+
+    def split(self, text):
+        # Segments of at most max_chars characters that concatenate back to text
+        segments = []
+        while len(text) > self.max_chars:
+            window = text[:self.max_chars]
+            cut = 0
+            for boundary in self.BOUNDARIES:
+                ends = [match.end() for match in boundary.finditer(window) if match.end() < len(window)]
+                if ends:
+                    cut = ends[-1]
+                    break
+            cut = cut or self.max_chars
+            segments.append(text[:cut])
+            text = text[cut:]
+        segments.append(text)
+        return segments
+
+    def join(self, segments, translations):
+        return ''.join(restore_whitespace(segment, translated) for segment, translated in zip(segments, translations))
+
+    def requests(self, texts, pack=True):
+        # Returns [(payload, groups)]: payload is the list sent in one translate_batch() call,
+        # groups[i] the texts packed into payload[i]
+        packing = pack and self.delimiter and self.max_batch == 1
+        requests = []
+        groups, chars, open_group = [], 0, False
+        for text in texts:
+            packable = packing and self.delimiter not in text
+            if open_group and packable and chars + len(self.delimiter) + len(text) <= self.max_chars:
+                groups[-1].append(text)
+                chars += len(self.delimiter) + len(text)
+                continue
+            if groups and (packing or len(groups) >= self.max_batch or chars + len(text) > self.max_chars):
+                requests.append(groups)
+                groups, chars = [], 0
+            groups.append([text])
+            chars += len(text)
+            open_group = packable
+        if groups:
+            requests.append(groups)
+        return [([self.delimiter.join(group) if len(group) > 1 else group[0] for group in request], request)
+                for request in requests]
+
+    def unpack(self, group, translated):
+        # Translations of the texts packed in group, or None when the delimiters did not survive
+        if len(group) == 1:
+            return [translated]
+        parts = [part.strip() for part in translated.split(self.delimiter.strip() or self.delimiter)]
+        parts = [part for part in parts if part] if len(parts) != len(group) else parts
+        return parts if len(parts) == len(group) else None
+
+
+def term_pattern(terms, ignore_case=False):
+    """One compiled regex matching any of terms as a whole word, longest term first.
+
+    The alternatives are laid out as a trie (shared prefixes are tested once), so matching
+    costs about the same for ten terms as for ten thousand, like an Aho-Corasick automaton."""
+    trie = {}
+    for term in terms:
+        node = trie
+        for char in (term.lower() if ignore_case else term):
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    def pattern(node):
+        ends = '' in node
+        branches = [re.escape(char) + pattern(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if ends:
+            return f"(?:{body})?" if len(branches) > 1 or len(body) > 1 else body + '?'
+        return body
+
+    if not trie:
+        return None
+    return re.compile(r'(?<!\w)' + pattern(trie) + r'(?!\w)', re.IGNORECASE if ignore_case else 0)
+
+
+class PreFilter:
+    """Decides before any translation request which values are sent at all.
+
+    Values matching one of the skip rules keep their text: product codes and SKUs, URLs and
+    e-mail addresses, EANs and other numbers, sizes and measures ("42 EU", "2.5 kg"), markup
+    without text, and the extra `patterns`. Glossary terms inside the values that are sent
+    are protected from the translator (`protect`) or always translated the same way
+    (`terms`, {term: translation} or {term: {target language: translation}}); values made
+    only of such terms need no request at all."""
+
+    RULES = {
+        'code': re.compile(r'[A-Z0-9\s\-_./]+'),
+        'sku': re.compile(r'(?=\S*\d\S*\d)[A-Za-z0-9][\w\-./#+]*'),
+        'url': re.compile(r'(?:https?://|ftp://|www\.)\S+|[\w.+-]+@[\w-]+\.[\w.-]+'),
+        'number': re.compile(r'[+\-]?[\d\s.,:;/%#()x×+\-]*\d[\d\s.,:;/%#()x×+\-]*'),
+        'measure': re.compile(r'\d+(?:[.,]\d+)?(?:\s*[x×/\-]\s*\d+(?:[.,]\d+)?)*\s*'
+                              r'(?:mm|cm|dm|m|km|mg|g|kg|t|ml|cl|dl|l|oz|lbs?|in|ft|"|w|kw|v|mah|wh|'
+                              r'kb|mb|gb|tb|hz|khz|mhz|ghz|px|dpi|eu|us|uk|fr|it|°c|°f|%)\.?', re.IGNORECASE),
+        'markup': re.compile(r'(?:\s|<[^>]*>|&#?\w+;)*'),
+    }
+    # Marks a glossary term in the text sent to the translator; providers leave it alone
+    PLACEHOLDER = re.compile(r'⟦\s*(\d+)\s*⟧')
+    LETTER = re.compile(r'[^\W\d_]')
+    # Values kept out of the translator that are remembered, so repeats are not counted as saved requests
+    SEEN_SIZE = 100000
+
+    def __init__(self, target_lang=None, rules=None, patterns=(), protect=(), terms=None, ignore_case=False):
+        names = list(self.RULES) if rules is None else list(rules)
+        unknown = [name for name in names if name not in self.RULES]
+        if unknown:
+            raise ValueError(f"Unknown pre-filter rules: {', '.join(unknown)}, available: {', '.join(self.RULES)}")
+        self.rules = [(name, self.RULES[name]) for name in names]
+        self.rules += [('pattern', re.compile(pattern)) for pattern in patterns]
+        self.ignore_case = ignore_case
+        # term -> its fixed translation, None to keep it as it is
+        glossary = {term: None for term in protect}
+        for term, translation in (terms or {}).items():
+            if isinstance(translation, dict):
+                translation = translation.get(target_lang)
+            if translation is not None:
+                glossary[term] = translation
+        self.glossary = {(term.lower() if ignore_case else term): translation
+                         for term, translation in glossary.items() if term.strip()}
+        self.matcher = term_pattern(self.glossary, ignore_case)
+        self._seen = OrderedDict()
+
+    @classmethod
+    def from_config(cls, config, target_lang=None):
+        # config as read by load_prefilter_config(); None gives the default rules
+        config = config or {}
+        return cls(target_lang, config.get('rules'), config.get('patterns', ()), config.get('protect', ()),
+                   config.get('terms'), config.get('ignore_case', False))
+
+    def fingerprint(self):
+        # Changes whenever the settings would keep other values or translate terms differently
+        settings = [[name, rule.pattern] for name, rule in self.rules], sorted(self.glossary.items()), self.ignore_case
+        return hashlib.sha1(json.dumps(settings, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+    def skip_rule(self, text):
+        # Name of the rule that keeps the stripped text untranslated, None when it is sent
+        for name, rule in self.rules:
+            if rule.fullmatch(text):
+                return name
+        return None
+
+    def first_seen(self, texts):
+        # The texts not kept out of the translator before; later repeats would have been cache hits
+        new = []
+        for text in texts:
+            if text in self._seen:
+                self._seen.move_to_end(text)
+            else:
+                self._seen[text] = None
+                new.append(text)
+        while len(self._seen) > self.SEEN_SIZE:
+            self._seen.popitem(last=False)
+        return new
+
+    def protect(self, text):
+        # Returns (text with placeholders for the glossary terms, [(original, translation)])
+        if self.matcher is None or '⟦' in text:
+            return text, []
+        terms = []
+
+        def placeholder(match):
+            original = match.group(0)
+            translation = self.glossary[original.lower() if self.ignore_case else original]
+            terms.append((original, original if translation is None else translation))
+            return f"⟦{len(terms) - 1}⟧"
+
+        return self.matcher.sub(placeholder, text), terms
+
+    def needs_translation(self, text):
+        # False when only glossary terms, digits and punctuation are left
+        return self.LETTER.search(self.PLACEHOLDER.sub('', text)) is not None
+
+    def restore(self, text, terms):
+        # Puts the glossary terms back; None when the translator lost one of the placeholders
+        found = []
+
+        def term(match):
+            n = int(match.group(1))
+            if n >= len(terms):
+                return match.group(0)
+            found.append(n)
+            return terms[n][1]
+
+        restored = self.PLACEHOLDER.sub(term, text)
+        return restored if sorted(found) == list(range(len(terms))) else None
+
+
+def load_prefilter_config(path):
+    # {"rules": [...], "patterns": [...], "protect": [...], "terms": {...}, "ignore_case": false}
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+    if not isinstance(config, dict):
+        raise ValueError(f"{path} is not a pre-filter file")
+    PreFilter.from_config(config)  # raises for unknown rules and invalid patterns
+    return config
+
+
+class TranslationMemory:
+    """Persistent translation cache (SQLite) with an in-process LRU in front of it. Entries
+    are kept per backend, so one provider's output is never served for another's.
+
+    Several processes may share the file: writes are committed as they happen, in short
+    transactions, so no process holds the write lock for long and every process sees the
+    translations of the others. evict_on_open=False skips evicting old entries, for
+    processes that open a memory their parent has already evicted."""
+
+    def __init__(self, path=DEFAULT_MEMORY_PATH, lru_size=20000, max_entries=500000, max_age_days=180,
+                 evict_on_open=True):
+        self.path = path
+        self.lru_size = lru_size
+        self.max_entries = max_entries
+        self.max_age = max_age_days * 86400 if max_age_days else None
+        self.hits = 0
+        self.misses = 0
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+
+        if path != ':memory:':
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        # Autocommit; statements that belong together run in explicit short transactions
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction():
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(translations)")]
+            if columns and 'backend' not in columns:
+                # Entries of older versions do not say which backend made them
+                self._conn.execute("DROP TABLE translations")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS translations ("
+                "backend TEXT NOT NULL, source_lang TEXT NOT NULL, target_lang TEXT NOT NULL, "
+                "text TEXT NOT NULL, translation TEXT NOT NULL, created REAL NOT NULL, "
+                "PRIMARY KEY (backend, source_lang, target_lang, text))"
+            )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_translations_created ON translations (created)")
+        if evict_on_open:
+            self.evict()
+
+    def get(self, backend, source_lang, target_lang, text):
+        key = (backend, source_lang, target_lang, text)
+        with self._lock:
+            if key in self._lru:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return self._lru[key]
+
+            row = self._conn.execute(
+                "SELECT translation, created FROM translations "
+                "WHERE backend = ? AND source_lang = ? AND target_lang = ? AND text = ?", key
+            ).fetchone()
+            if row and (self.max_age is None or row[1] >= time.time() - self.max_age):
+                self._remember(key, row[0])
+                self.hits += 1
+                return row[0]
+
+            self.misses += 1
+            return None
+
+    def put(self, backend, source_lang, target_lang, text, translation):
+        self.put_many(backend, source_lang, target_lang, {text: translation})
+
+    def put_many(self, backend, source_lang, target_lang, translations):
+        # Stores {text: translation} in one transaction
+        if not translations:
+            return
+        now = time.time()
+        rows = [(backend, source_lang, target_lang, text, translation, now)
+                for text, translation in translations.items()]
+        with self._lock:
+            for row in rows:
+                self._remember(row[:4], row[4])
+            with self._transaction():
+                self._conn.executemany("INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    @contextmanager
+    def _transaction(self):
+        # Takes the write lock up front: waiting for it at BEGIN respects the busy timeout,
+        # upgrading a read transaction later could fail right away
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            raise
+        self._conn.execute("COMMIT")
+
+    def _remember(self, key, translation):
+        self._lru[key] = translation
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.lru_size:
+            self._lru.popitem(last=False)
+
+    def evict(self):
+        with self._lock, self._transaction():
+            if self.max_age:
+                self._conn.execute("DELETE FROM translations WHERE created < ?", (time.time() - self.max_age,))
+            if self.max_entries:
+                count = self._conn.execute("SELECT COUNT(*) FROM translations").fetchone()[0]
+                if count > self.max_entries:
+                    self._conn.execute(
+                        "DELETE FROM translations WHERE rowid IN "
+                        "(SELECT rowid FROM translations ORDER BY created LIMIT ?)",
+                        (count - self.max_entries,)
+                    )
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / total if total else 0.0,
+        }
+
+    def reset_stats(self):
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        self._conn.close()
+
+
+def detect_fields(file_path, max_products=500, time_budget=1.0):
+    """Merge the fields of the first max_products products (or as many as parsed within
+    time_budget seconds). Each field gets the number of sampled products that have it and
+    up to three sample values."""
+    if not os.path.exists(file_path):
+        return []
+
+    fields = {}
+
+    def add(product_fields, name, path, text):
+        field = fields.get(path)
+        if field is None:
+            field = fields[path] = {'name': name, 'path': path, 'sample': '', 'samples': [], 'count': 0}
+        if path not in product_fields:
+            product_fields.add(path)
+            field['count'] += 1
+        text = (text or '').strip()
+        if text:
+            text = text[:50] + ("..." if len(text) > 50 else "")
+            if not field['sample']:
+                field['sample'] = text
+            if len(field['samples']) < 3 and text not in field['samples']:
+                field['samples'].append(text)
+
+    deadline = time.monotonic() + time_budget if time_budget else None
+    products = iter_products(file_path)
+    try:
+        for n, product in enumerate(products):
+            product_fields = set()
+            # Standard fields
+            for child in product:
+                if isinstance(child.tag, str):
+                    add(product_fields, local_name(child), f"/product/{local_name(child)}", element_string(child))
+
+            # Nested fields
+            for tag in product.iter('{*}category', '{*}attribute'):
+                if local_name(tag) == 'category':
+                    add(product_fields, 'category', "//category", element_string(tag))
+                else:
+                    attr_name = tag.find('{*}name')
+                    if attr_name is not None and element_string(attr_name):
+                        label = tag.find('{*}label')
+                        add(product_fields, f"attribute/{attr_name.text}",
+                            f"//attribute[name='{attr_name.text}']/label",
+                            element_string(label) if label is not None else None)
+
+            if n + 1 >= max_products or (deadline and time.monotonic() > deadline):
+                break
+    finally:
+        products.close()
+    return list(fields.values())
+
+
+def load_field_mapping(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        fields = json.load(f)
+    if not isinstance(fields, list) or not all(isinstance(field, dict) and 'path' in field for field in fields):
+        raise ValueError(f"{path} is not a field mapping file")
+    for field in fields:
+        field.setdefault('name', field['path'].rsplit('/', 1)[-1])
+    return fields
+
+
+def save_field_mapping(path, fields):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump([{'name': field['name'], 'path': field['path']} for field in fields], f,
+                  ensure_ascii=False, indent=2)
+
+
+class ExtractionPlan:
+    """The field mapping compiled once. Each product is walked a single time to build a
+    name -> elements index that every selected field reads from."""
+
+    ATTRIBUTE_PATH = re.compile(r"^//attribute\[name='(.*)'\]/label$")
+
+    def __init__(self, field_mapping):
+        self.fields = []
+        wanted = set()
+        for field in field_mapping:
+            path = field['path']
+            if path.startswith('/product/'):
+                rule = ('tag', path.split('/')[-1])
+            elif path.startswith('//category'):
+                rule = ('tag', 'category')
+            elif path.startswith('//attribute'):
+                match = self.ATTRIBUTE_PATH.match(path)
+                rule = ('attribute', match.group(1) if match else field['name'].split('/')[-1])
+            else:
+                continue
+            self.fields.append((field, rule))
+            wanted.add(rule[1] if rule[0] == 'tag' else 'attribute')
+        self.wanted = wanted
+        self.tags = tuple('{*}' + name for name in sorted(wanted))
+
+    def index(self, product):
+        # One walk over the product: elements by local name, attribute labels by attribute name
+        by_name = {}
+        labels = {}
+        if not self.tags:
+            return by_name, labels
+        for elem in product.iter(*self.tags):
+            if elem is product:
+                continue
+            name = local_name(elem)
+            by_name.setdefault(name, []).append(elem)
+            if name == 'attribute':
+                attr_name = label = None
+                for child in elem:
+                    if isinstance(child.tag, str):
+                        child_name = local_name(child)
+                        if child_name == 'name' and attr_name is None:
+                            attr_name = element_string(child)
+                        elif child_name == 'label' and label is None:
+                            label = child
+                if attr_name is not None and label is not None:
+                    labels.setdefault(attr_name, []).append(label)
+        return by_name, labels
+
+    def extract(self, product):
+        # [(field, text-bearing elements)] in field order
+        by_name, labels = self.index(product)
+        result = []
+        for field, (kind, name) in self.fields:
+            elems = by_name.get(name, ()) if kind == 'tag' else labels.get(name, ())
+            result.append((field, [elem for elem in elems if element_string(elem)]))
+        return result
+
+    def nodes(self, product):
+        # Text-bearing elements selected by the field mapping, each element once
+        nodes = []
+        seen = set()
+        for _, elems in self.extract(product):
+            for elem in elems:
+                if elem not in seen:
+                    seen.add(elem)
+                    nodes.append(elem)
+        return nodes
+
+
+class TranslationStopped(Exception):
+    pass
+
+
+def delta_scope(field_mapping, source_lang, target_lang, id_field, prefilter, backend):
+    # What the stored products of a DeltaState depend on; prefilter is the job's PreFilter
+    return {
+        'fields': [[field['name'], field['path']] for field in field_mapping],
+        'backend': backend,
+        'source_lang': source_lang,
+        'target_lang': target_lang,
+        'id_field': id_field,
+        'prefilter': prefilter.fingerprint(),
+    }
+
+
+class DeltaState:
+    """Fingerprints and translated values of the products of previous runs, by product id.
+    Products whose selected fields are unchanged get their translations copied."""
+
+    def __init__(self, path, scope, run=None):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS products ("
+            "id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, translated TEXT NOT NULL, run INTEGER NOT NULL)"
+        )
+        # A different mapping or language pair invalidates every stored product
+        scope = json.dumps(scope, sort_keys=True)
+        row = self._conn.execute("SELECT value FROM meta WHERE key = 'scope'").fetchone()
+        if not row or row[0] != scope:
+            self._conn.execute("DELETE FROM products")
+            self._conn.execute("INSERT OR REPLACE INTO meta VALUES ('scope', ?)", (scope,))
+        if run is None:
+            run = (self._conn.execute("SELECT MAX(run) FROM products").fetchone()[0] or 0) + 1
+        self.run = run
+        self._conn.commit()
+
+    @staticmethod
+    def fingerprint(texts):
+        return hashlib.sha1('\x1f'.join(texts).encode('utf-8')).hexdigest()
+
+    def get(self, product_id):
+        row = self._conn.execute(
+            "SELECT fingerprint, translated FROM products WHERE id = ?", (product_id,)
+        ).fetchone()
+        return (row[0], json.loads(row[1])) if row else None
+
+    def put(self, product_id, fingerprint, translated):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?)",
+            (product_id, fingerprint, json.dumps(translated, ensure_ascii=False), self.run)
+        )
+
+    def touch(self, product_id):
+        self._conn.execute("UPDATE products SET run = ? WHERE id = ?", (self.run, product_id))
+
+    def prune(self):
+        # Forget products that were not in this (complete) run
+        self._conn.execute("DELETE FROM products WHERE run < ?", (self.run,))
+
+    def flush(self):
+        self._conn.commit()
+
+    def close(self):
+        self._conn.commit()
+        self._conn.close()
+
+
+class CheckpointJournal:
+    """Append-only journal (JSON lines) of translated strings and of checkpoints
+    (products completed, bytes of partial output that hold them)."""
+
+    def __init__(self, path, header, fsync_interval=5.0):
+        self.path = path
+        self.header = header
+        self.fsync_interval = fsync_interval
+        self._file = None
+        self._last_sync = 0.0
+        self._valid_size = None
+
+    def load(self):
+        # Returns (products, offset, strings) of the last checkpoint, or None when the
+        # journal is missing or belongs to a different input/mapping
+        if not os.path.exists(self.path):
+            return None
+        products, offset, strings = 0, 0, {}
+        size = 0
+        with open(self.path, 'rb') as f:
+            for n, line in enumerate(f):
+                try:
+                    if not line.endswith(b'\n'):
+                        raise ValueError
+                    record = json.loads(line)
+                except ValueError:
+                    break  # torn last line
+                size += len(line)
+                if n == 0:
+                    if record != {'type': 'header', **self.header}:
+                        return None
+                elif record['type'] == 'strings':
+                    strings.update(record['items'])
+                elif record['type'] == 'checkpoint':
+                    products, offset = record['products'], record['offset']
+        self._valid_size = size
+        return products, offset, strings
+
+    def open(self, resume):
+        # resume appends to the journal load() has read, after its last complete line
+        if resume:
+            with open(self.path, 'r+b') as f:
+                f.truncate(self._valid_size)
+            self._file = open(self.path, 'a', encoding='utf-8')
+        else:
+            self._file = open(self.path, 'w', encoding='utf-8')
+            self._append({'type': 'header', **self.header})
+            self._sync()
+        self._last_sync = time.monotonic()
+
+    def record_strings(self, items):
+        if items:
+            self._append({'type': 'strings', 'items': items})
+
+    def checkpoint(self, products, out):
+        # The partial output is synced before the checkpoint that refers to it
+        if time.monotonic() - self._last_sync < self.fsync_interval:
+            return
+        out.flush()
+        os.fsync(out.fileno())
+        self._append({'type': 'checkpoint', 'products': products, 'offset': out.tell()})
+        self._sync()
+        self._last_sync = time.monotonic()
+
+    def _append(self, record):
+        self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if self._file:
+            self._sync()
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        self.close()
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+class _ResumeWriter:
+    # Drops the bytes the engine regenerates for products already in the partial output
+    def __init__(self, out, skip_products):
+        self.out = out
+        self.skip_products = skip_products
+        self.skipping = skip_products > 0
+
+    def write(self, data):
+        if not self.skipping:
+            self.out.write(data)
+
+
+class TranslationJob:
+    """Translates the selected fields of one feed. Runs without Qt; progress is
+    reported through the on_* callbacks."""
+
+    def __init__(self, input_file, output_file, field_mapping, source_lang, target_lang, memory=None,
+                 concurrency=4, requests_per_second=5.0, resume=True, delta_state=None, id_field=None,
+                 backend='google', backend_options=None, source=None, prefilter=None):
+        self.input_file = input_file
+        # Reads a part of input_file instead of all of it (see FeedShard)
+        self.source = source
+        self.output_file = output_file
+        self.partial_file = output_file + '.part'
+        self.resume_enabled = resume
+        self.delta_state = delta_state
+        # Set when several processes share delta_state: their common run number, pruned by the caller
+        self.delta_run = None
+        self.id_field = id_field
+        self.field_mapping = field_mapping
+        self.plan = ExtractionPlan(field_mapping)
+        self.source_lang = source_lang
+        self.target_lang = target_lang
+        # prefilter: skip rules and glossary settings, see load_prefilter_config()
+        self.prefilter = PreFilter.from_config(prefilter, target_lang)
+        self.memory = memory
+        self.concurrency = max(1, concurrency)
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown translator backend {backend!r}")
+        self.backend_name = backend
+        self.backend_options = backend_options or {}
+        self.requests_per_second = requests_per_second
+        # Share of the request rate this job may use when other processes send to the same provider
+        self.rate_share = 1.0
+        self.rate_limiter = None
+        self.breaker = CircuitBreaker()
+        self.planner = None
+        self.max_retries = 4
+        self.retry_delay = 1.0
+        self.max_backoff = 30.0
+        self.requeue_rounds = 1
+        # The job fails when the translator still fails after this many pauses without a request
+        # succeeding in between
+        self.max_circuit_pauses = 3
+        self.untranslated = 0
+        self._resume_at = None
+        self.window_size = 200
+        self.checkpoint_interval = 5.0
+        self.field_count = 0
+        self.resumed_products = 0
+        self.unchanged_products = 0
+        self._delta = None
+        self._input = None
+        self._input_size = 0
+        self._journal = None
+        self._pool = None
+        self._session_memory = None
+        self._started = None
+        self._backend = None
+        self._local = threading.local()
+        self._is_running = True
+        self._is_paused = False
+        self.samples = []
+        # When a dict, set_text() also records the texts it sets (see MultiTargetJob)
+        self.edits = None
+        self.on_progress = lambda current, total, message: None
+        self.on_field_progress = lambda message: None
+        self.on_samples = lambda samples: None
+        self.on_metrics = lambda metrics: None
+        self.on_notice = lambda message: None
+        self.on_paused = lambda: None
+        self.on_resumed = lambda: None
+        self.metrics = RunMetrics()
+        self.metrics_file = output_file + '.metrics.json'
+
+    def stop(self):
+        self._is_running = False
+        
+    def pause(self):
+        self._resume_at = None
+        self._is_paused = True
+
+    def resume(self):
+        self._resume_at = None
+        self._is_paused = False
+
+    def wait_if_paused(self):
+        # Returns False once the job has been stopped
+        while self._is_paused and self._is_running:
+            resume_at = self._resume_at
+            if resume_at is not None and time.monotonic() >= resume_at:
+                # End of a circuit breaker pause
+                self.resume()
+                self.on_notice("Resuming translation")
+                self.on_resumed()
+                break
+            time.sleep(0.1)
+        return self._is_running
+
+    def get_backend(self):
+        # Backends that keep per-request state get one instance per thread
+        if self._backend.thread_safe:
+            return self._backend
+        backend = getattr(self._local, 'backend', None)
+        if backend is None:
+            backend = self._local.backend = create_backend(self.backend_name, self.source_lang, self.target_lang,
+                                                           **self.backend_options)
+        return backend
+
+    def start_backend(self):
+        # Batches and the request rate follow the limits the backend declares
+        self._backend = create_backend(self.backend_name, self.source_lang, self.target_lang, **self.backend_options)
+        self._local = threading.local()
+        if not self._backend.thread_safe:
+            self._local.backend = self._backend
+        self.planner = RequestPlanner(self._backend.max_chars, self._backend.max_batch,
+                                      self._backend.pack_delimiter)
+        rate = self.requests_per_second
+        if self._backend.requests_per_second:
+            rate = min(rate, self._backend.requests_per_second)
+        rate *= self.rate_share
+        # Starts at the configured rate, backs off while the provider throttles
+        self.rate_limiter = AdaptiveRateLimiter(rate)
+        self.breaker = CircuitBreaker()
+
+    def translation_key(self, text):
+        if not text or not text.strip():
+            return None
+        if self.prefilter.skip_rule(text.strip()):
+            return None
+        return normalize_text(text)
+
+    def translate_text(self, text):
+        key = self.translation_key(text)
+        if key is None:
+            return text
+        translated = self.translate_unique([key]).get(key)
+        return restore_whitespace(text, translated) if translated else text
+
+    def translate_unique(self, keys):
+        # Returns {normalized text: translation}; keys missing from the result stay untranslated.
+        # Glossary terms are sent as placeholders, values made only of them need no request.
+        if self._backend is None:
+            self.start_backend()
+        results = {}
+        protected = {}
+        for key in keys:
+            payload, terms = self.prefilter.protect(key)
+            if not terms:
+                continue
+            if self.prefilter.needs_translation(payload):
+                protected[key] = (payload, terms)
+            else:
+                results[key] = self.prefilter.restore(payload, terms)
+        if results:
+            self.metrics.count('glossary_resolved', len(results))
+            new = self.prefilter.first_seen(results)
+            if new:
+                self.metrics.count('prefilter_saved_calls', len(self.planner.requests(new)))
+
+        pending = [key for key in keys if key not in results]
+        translated = self.translate_payloads(list(dict.fromkeys(
+            protected[key][0] if key in protected else key for key in pending)))
+        lost = 0
+        for key in pending:
+            if key in protected:
+                payload, terms = protected[key]
+                value = translated.get(payload)
+                if value:
+                    value = self.prefilter.restore(value, terms)
+                    lost += value is None
+            else:
+                value = translated.get(key)
+            if value:
+                results[key] = value
+        if lost:
+            self.metrics.count('untranslated', lost)
+            self.untranslated += lost
+            self.on_notice(f"The translator dropped glossary terms of {lost} strings, they keep their original text")
+        return results
+
+    def translate_payloads(self, keys):
+        # Returns {text: translation} of the texts sent to the translator, from the
+        # translation memory or the backend
+        results = {}
+        missing = []
+        with self.metrics.stage('cache'):
+            for key in keys:
+                cached = (self.memory.get(self.backend_name, self.source_lang, self.target_lang, key)
+                          if self.memory else None)
+                if cached is not None:
+                    results[key] = cached
+                else:
+                    missing.append(key)
+        self.metrics.count('cache_hits', len(results))
+        self.metrics.count('cache_misses', len(missing))
+
+        # Oversized strings are translated as segments, each distinct segment once
+        segmented = {key: self.planner.split(key) for key in missing}
+        segments = list(dict.fromkeys(segment for parts in segmented.values() for segment in parts))
+
+        # Keep up to `concurrency` requests in flight; results are collected per request
+        # and applied by the caller in document order. Segments whose requests failed even
+        # after retries are queued again, unpacked, for another round.
+        translated_segments = {}
+        pending = segments
+        for round_number in range(1 + self.requeue_rounds):
+            if round_number:
+                if not pending or not self._is_running:
+                    break
+                self.metrics.count('requeued', len(pending))
+                self.on_field_progress(f"Retrying {len(pending)} strings that failed to translate")
+            requests = self.planner.requests(pending, pack=not round_number)
+            if self._pool and len(requests) > 1:
+                translated_requests = self._pool.map(self.translate_request, requests)
+            else:
+                translated_requests = map(self.translate_request, requests)
+            for translated in translated_requests:
+                translated_segments.update(translated)
+            pending = [segment for segment in pending if not translated_segments.get(segment)]
+
+        new = {}
+        for key, parts in segmented.items():
+            if all(translated_segments.get(part) for part in parts):
+                value = self.planner.join(parts, [translated_segments[part] for part in parts])
+                new[key] = value
+        if self.memory:
+            self.memory.put_many(self.backend_name, self.source_lang, self.target_lang, new)
+        if self._journal:
+            self._journal.record_strings(new)
+        self.metrics.count('api_translated', len(new))
+        self.metrics.count('untranslated', len(missing) - len(new))
+        if self._is_running and len(new) < len(missing):
+            self.untranslated += len(missing) - len(new)
+            self.on_notice(f"{len(missing) - len(new)} strings could not be translated and keep their original text")
+        results.update(new)
+        return results
+
+    def translate_request(self, request):
+        # Returns {text: translation} for one planned request; texts whose packing did not
+        # survive the round-trip are sent again unpacked
+        payload, groups = request
+        results = {}
+        retry = []
+        for group, translated in zip(groups, self.translate_batch(payload)):
+            if not translated:
+                continue
+            parts = self.planner.unpack(group, translated)
+            if parts is None:
+                retry.extend(group)
+            else:
+                results.update(zip(group, parts))
+        if retry:
+            self.metrics.count('unpack_retries', len(retry))
+            for payload, groups in self.planner.requests(retry, pack=False):
+                results.update((group[0], translated) for group, translated in zip(groups, self.translate_batch(payload))
+                               if translated)
+        return results
+
+    def translate_batch(self, batch):
+        # Returns the translations of batch, or [] when the request failed for good.
+        # Transient failures are retried with jittered exponential backoff; throttling
+        # also slows the rate limiter down and repeated failures open the circuit breaker.
+        # Errors of this request alone (a text the provider rejects) leave its strings to
+        # the re-queue round; configuration errors (key, URL or language) fail the job, as
+        # does a circuit that keeps opening.
+        backend = self.get_backend()
+        for attempt in range(self.max_retries + 1):
+            if not self.wait_if_paused() or not self.rate_limiter.acquire(backend.requests_for(batch),
+                                                                           self.wait_if_paused):
+                return []
+            started = time.perf_counter()
+            try:
+                translated = backend.translate_batch(batch)
+            except Exception as e:
+                self.metrics.record_call(time.perf_counter() - started, len(batch), e)
+                if is_configuration_error(e):
+                    self.stop()
+                    raise
+                if not is_transient(e):
+                    self.on_field_progress(f"Translation request of {len(batch)} strings rejected: "
+                                           f"{type(e).__name__}: {str(e)}")
+                    if len(batch) > 1:
+                        # Only some of the texts may be at fault: send them one by one
+                        return [(self.translate_batch([text]) or [''])[0] for text in batch]
+                    return []
+                throttled = is_throttled(e)
+                final = attempt == self.max_retries
+                if throttled:
+                    self.metrics.count('throttled')
+                    self.rate_limiter.throttled()
+                # Throttling is the rate limiter's business until retries run out
+                cooldown = self.breaker.failure() if final or not throttled else None
+                if cooldown:
+                    if self.breaker.opened > self.max_circuit_pauses:
+                        self.stop()
+                        raise BackendError(f"The translator kept failing after {self.breaker.opened - 1} pauses "
+                                           f"({type(e).__name__}: {str(e)})") from e
+                    self.open_circuit(cooldown, e)
+                if final:
+                    self.on_notice(f"Translation request of {len(batch)} strings failed: "
+                                   f"{type(e).__name__}: {str(e)}")
+                    return []
+                delay = self.backoff(attempt, getattr(e, 'retry_after', None))
+                self.metrics.count('retries')
+                self.on_field_progress(f"{type(e).__name__} from the translator, retrying in {delay:.1f}s")
+                if not self.sleep(delay):
+                    return []
+                continue
+            self.metrics.record_call(time.perf_counter() - started, len(batch))
+            self.rate_limiter.succeeded()
+            self.breaker.success()
+            self.metrics.set_gauge('request_rate', round(self.rate_limiter.rate, 2))
+            return translated
+        return []
+
+    def backoff(self, attempt, retry_after=None):
+        # Exponential backoff with full jitter, never shorter than the provider's Retry-After
+        delay = random.uniform(0, min(self.max_backoff, self.retry_delay * 2 ** attempt))
+        return max(delay, retry_after or 0.0)
+
+    def sleep(self, seconds):
+        # Sleeps while the job runs; False when it was stopped meanwhile
+        deadline = time.monotonic() + seconds
+        while self._is_running and time.monotonic() < deadline:
+            time.sleep(min(0.1, max(0.0, deadline - time.monotonic())))
+        return self.wait_if_paused()
+
+    def open_circuit(self, cooldown, error):
+        # Pauses the job for the cool-down; wait_if_paused() resumes it when it is over
+        self._resume_at = time.monotonic() + cooldown
+        self._is_paused = True
+        self.metrics.count('circuit_opened')
+        self.on_notice(f"Translator keeps failing ({type(error).__name__}: {str(error)}), "
+                       f"pausing for {cooldown:.0f}s")
+        self.on_paused()
+
+    def apply_translation(self, elem, original, translated):
+        self.set_text(elem, original, restore_whitespace(original, translated))
+
+    def set_text(self, elem, original, text):
+        value = text_value(original, text)
+        elem.text = value
+        if self.edits is not None:
+            self.edits[elem] = value
+
+    def product_id(self, product):
+        if self.id_field:
+            if self.id_field.startswith('@'):
+                return product.get(self.id_field[1:])
+            tag = product.find('{*}' + self.id_field)
+            return element_string(tag).strip() if tag is not None and element_string(tag) else None
+        if product.get('id'):
+            return product.get('id')
+        for child in product:
+            if isinstance(child.tag, str) and local_name(child) in ('id', 'sku', 'code', 'product_id'):
+                text = element_string(child)
+                if text and text.strip():
+                    return text.strip()
+        return None
+
+    def process_window(self, products, count):
+        if not self.wait_if_paused():
+            raise TranslationStopped()
+        if count <= self.resumed_products:
+            # Already in the partial output of the interrupted run
+            self.report_progress(count)
+            return
+        window = self.prepare_window(products)
+        translations = self.translate_window(window)
+        self.apply_window(window, translations)
+        self.report_progress(count)
+        self.on_metrics(self.metrics_summary())
+
+    def metrics_summary(self):
+        return self.metrics.to_dict()
+
+    def prepare_window(self, products, nodes=None):
+        # Pass one: record the selected elements and the unique strings of this window.
+        # nodes, when given, holds the already extracted elements of each product
+        extract_started = time.perf_counter()
+        entries = []
+        unique = {}
+        reused = []
+        changed = []
+        skipped = 0
+        filtered = {}
+        for n, product in enumerate(products):
+            product_nodes = self.plan.nodes(product) if nodes is None else nodes[n]
+            if self._delta:
+                product_id = self.product_id(product)
+                if product_id is not None:
+                    originals = [elem.text for elem in product_nodes]
+                    fingerprint = DeltaState.fingerprint(originals)
+                    previous = self._delta.get(product_id)
+                    if previous and previous[0] == fingerprint and len(previous[1]) == len(product_nodes):
+                        reused.append((product_id, product_nodes, originals, previous[1]))
+                        continue
+                    changed.append((product_id, fingerprint, product_nodes, originals))
+
+            for elem in product_nodes:
+                original = elem.text
+                key = self.translation_key(original)
+                if key is not None:
+                    entries.append((elem, original, key))
+                    unique[key] = None
+                elif original.strip():
+                    skipped += 1
+                    filtered[normalize_text(original)] = self.prefilter.skip_rule(original.strip())
+        self.metrics.add_time('extract', time.perf_counter() - extract_started)
+        self.metrics.count('products', len(products))
+        self.metrics.count('fields', len(entries))
+        self.metrics.count('unique_strings', len(unique))
+        self.metrics.count('skipped_by_filter', skipped)
+        new = self.prefilter.first_seen(filtered)
+        if new:
+            # Distinct values the pre-filter kept, by rule, and the requests they would have needed
+            for text in new:
+                self.metrics.count('skipped_' + filtered[text])
+            self.metrics.count('prefilter_saved_calls', len(self.planner.requests(new)))
+        return {'products': products, 'entries': entries, 'unique': list(unique),
+                'reused': reused, 'changed': changed}
+
+    def translate_window(self, window):
+        self.on_field_progress(f"Translating {len(window['unique'])} unique strings "
+                               f"from {len(window['entries'])} fields")
+        with self.metrics.stage('translate'):
+            translations = self.translate_unique(window['unique'])
+        if not self._is_running:
+            raise TranslationStopped()
+        return translations
+
+    def apply_window(self, window, translations):
+        self.field_count += len(window['entries'])
+        apply_started = time.perf_counter()
+
+        # Collect samples for first 5 products
+        if not self.samples:
+            for product in window['products'][:5]:
+                for field, elems in self.plan.extract(product):
+                    original = elems[0].text if elems else None
+                    if original:
+                        key = self.translation_key(original)
+                        translated = translations.get(key) if key is not None else None
+                        self.samples.append((field['name'], original,
+                                             restore_whitespace(original, translated) if translated else original))
+            if self.samples:
+                self.on_samples(self.samples)
+
+        # Pass two: write the translations back through the recorded elements
+        for elem, original, key in window['entries']:
+            translated = translations.get(key)
+            if translated:
+                self.apply_translation(elem, original, translated)
+
+        if self._delta:
+            # Unchanged products get the previous translations, changed ones are remembered
+            # once every string of theirs has been translated
+            for product_id, nodes, originals, previous in window['reused']:
+                for elem, original, text in zip(nodes, originals, previous):
+                    if text != original:
+                        self.set_text(elem, original, text)
+                self._delta.touch(product_id)
+            for product_id, fingerprint, nodes, originals in window['changed']:
+                keys = [self.translation_key(original) for original in originals]
+                if all(key is None or key in translations for key in keys):
+                    self._delta.put(product_id, fingerprint, [elem.text for elem in nodes])
+            self._delta.flush()
+            self.unchanged_products += len(window['reused'])
+            self.metrics.count('unchanged_products', len(window['reused']))
+        self.metrics.add_time('apply', time.perf_counter() - apply_started)
+
+    def report_progress(self, count):
+        position = self._input.tell() if self._input else 0
+        permille = min(1000, position * 1000 // self._input_size) if self._input_size else 1000
+        self.on_progress(permille, 1000, f"Product {count} ({permille / 10:.1f}%)")
+
+    def open_input(self):
+        return self.source.open() if self.source else open(self.input_file, 'rb')
+
+    def journal_header(self):
+        stat = os.stat(self.input_file)
+        header = {
+            'input': os.path.abspath(self.input_file),
+            'size': stat.st_size,
+            'mtime': stat.st_mtime_ns,
+            'fields': [[field['name'], field['path']] for field in self.field_mapping],
+            'source_lang': self.source_lang,
+            'target_lang': self.target_lang,
+            'backend': self.backend_name,
+            'window_size': self.window_size,
+            'prefilter': self.prefilter.fingerprint(),
+        }
+        if self.source:
+            header['shard'] = self.source.describe()
+        return header
+
+    def open_partial_output(self):
+        # Picks up the partial output of an interrupted run when its journal matches
+        self._journal = CheckpointJournal(self.output_file + '.journal', self.journal_header(),
+                                          self.checkpoint_interval)
+        state = self._journal.load() if self.resume_enabled else None
+        if state and os.path.exists(self.partial_file) and os.path.getsize(self.partial_file) >= state[1]:
+            products, offset, strings = state
+            self.memory.put_many(self.backend_name, self.source_lang, self.target_lang, strings)
+            out = open(self.partial_file, 'r+b', buffering=OUTPUT_BUFFER_SIZE)
+            out.truncate(offset)
+            out.seek(offset)
+            self.resumed_products = products
+            self._journal.open(resume=True)
+            if products:
+                self.on_field_progress(f"Resuming after product {products}")
+        else:
+            out = open(self.partial_file, 'wb', buffering=OUTPUT_BUFFER_SIZE)
+            self.resumed_products = 0
+            self._journal.open(resume=False)
+        return out
+
+    def begin(self):
+        # Sets up the backend, pools and state of a run; end() releases them
+        self._started = time.monotonic()
+        self.field_count = 0
+        self.unchanged_products = 0
+        self.untranslated = 0
+        self.metrics = RunMetrics()
+        # Without a persistent memory, still reuse translations across windows of this run
+        if self.memory is None:
+            self._session_memory = self.memory = TranslationMemory(':memory:', max_entries=None, max_age_days=None)
+        if self.delta_state:
+            self._delta = DeltaState(self.delta_state, delta_scope(self.field_mapping, self.source_lang,
+                                                                   self.target_lang, self.id_field, self.prefilter,
+                                                                   self.backend_name),
+                                     self.delta_run)
+        self.start_backend()
+        self._input_size = self.source.size() if self.source else os.path.getsize(self.input_file)
+        self._pool = ThreadPoolExecutor(self.concurrency) if self.concurrency > 1 else None
+
+    def run(self):
+        # Returns a summary dict; raises TranslationStopped or the underlying error
+        try:
+            self.begin()
+            with self.open_input() as self._input, self.open_partial_output() as out:
+                writer = _ResumeWriter(out, self.resumed_products)
+                stream_started = time.perf_counter()
+                total = stream_products(self._input, writer, self.process_window, self.window_size,
+                                        lambda count: self.flushed(writer, count), self.metrics)
+                # Whatever the other stages did not account for is parsing
+                stages = self.metrics.stages
+                self.metrics.add_time('parse', time.perf_counter() - stream_started - sum(
+                    stages.get(name, 0.0) for name in ('extract', 'translate', 'apply', 'serialize')))
+                return self.complete(out, total)
+        finally:
+            self.end()
+
+    def flushed(self, writer, count):
+        if writer.skipping:
+            writer.skipping = count < self.resumed_products
+        else:
+            self._journal.checkpoint(count, writer.out)
+
+    def complete(self, out, total):
+        # Moves the finished output into place and returns the run summary
+        replace_file(out, self.output_file)
+        self._journal.remove()
+        if self._delta and not self.resumed_products and self.delta_run is None:
+            self._delta.prune()
+
+        stats = self.memory.stats()
+        self.metrics.finish()
+        saved = self.metrics.counters.get('prefilter_saved_calls', 0)
+        return {
+            'products': total,
+            'fields': self.field_count,
+            'resumed_products': self.resumed_products,
+            'unchanged_products': self.unchanged_products,
+            'untranslated': self.untranslated,
+            'memory': stats,
+            'metrics': self.metrics.to_dict(),
+            'metrics_file': self.metrics_file,
+            'elapsed': round(time.monotonic() - self._started, 3),
+            'message': (f"Translated {total} products, {self.field_count} fields"
+                        + (f", {self.unchanged_products} unchanged products reused" if self._delta else "")
+                        + (f", {self.untranslated} strings left untranslated" if self.untranslated else "")
+                        + (f", {saved} requests saved by the pre-filter" if saved else "")
+                        + f" (translation memory: {stats['hits']} hits, {stats['misses']} misses)"),
+        }
+
+    def end(self):
+        # On stop or failure the partial output and its journal stay for the next run
+        self._input = None
+        if self.metrics.elapsed is None:
+            self.metrics.finish()
+        try:
+            self.metrics.write(self.metrics_file)
+        except OSError as e:
+            self.on_notice(f"Could not write {self.metrics_file}: {str(e)}")
+        if self._journal:
+            self._journal.close()
+            self._journal = None
+        if self._delta:
+            self._delta.close()
+            self._delta = None
+        if self._pool:
+            self._pool.shutdown(wait=True, cancel_futures=True)
+            self._pool = None
+        if self._session_memory:
+            self._session_memory.close()
+            self._session_memory = self.memory = None
+
+
+def language_output_path(output_file, target_lang):
+    # translated_feed.xml -> translated_feed_de.xml
+    root, ext = os.path.splitext(output_file)
+    return f"{root}_{target_lang}{ext or '.xml'}"
+
+
+class MultiTargetJob:
+    """Translates one feed into several target languages in a single pass. The feed is
+    parsed and the selected fields extracted once; each window is translated into all
+    targets concurrently and every target is written to its own output file.
+
+    outputs maps each target language to its output file. Every target keeps its own
+    TranslationJob (backend, checkpoint journal, delta state, metrics file) in jobs."""
+
+    def __init__(self, input_file, outputs, field_mapping, source_lang, memory=None, concurrency=4,
+                 requests_per_second=5.0, resume=True, delta=False, id_field=None, backend='google',
+                 backend_options=None, source=None, prefilter=None):
+        self.input_file = input_file
+        self.source = source
+        self.plan = ExtractionPlan(field_mapping)
+        self.window_size = 200
+        self.jobs = [TranslationJob(input_file, output_file, field_mapping, source_lang, target_lang, memory=memory,
+                                    concurrency=concurrency, requests_per_second=requests_per_second,
+                                    resume=resume, delta_state=output_file + '.delta.db' if delta else None,
+                                    id_field=id_field, backend=backend, backend_options=backend_options,
+                                    source=source, prefilter=prefilter)
+                     for target_lang, output_file in outputs.items()]
+        self.metrics = RunMetrics()
+        self._variants = {}
+        self._input = None
+        self._input_size = 0
+        self.on_progress = lambda current, total, message: None
+        self.on_field_progress = lambda message: None
+        self.on_samples = lambda samples: None
+        self.on_metrics = lambda metrics: None
+        self.on_notice = lambda message: None
+        self.on_paused = lambda: None
+        self.on_resumed = lambda: None
+        for job in self.jobs:
+            job.window_size = self.window_size
+            job.on_field_progress = lambda message, target=job.target_lang: self.on_field_progress(
+                f"[{target}] {message}")
+            job.on_notice = lambda message, target=job.target_lang: self.on_notice(f"[{target}] {message}")
+            job.on_paused = lambda: self.on_paused()
+            job.on_resumed = lambda: self.on_resumed()
+        self.jobs[0].on_samples = lambda samples: self.on_samples(samples)
+
+    def stop(self):
+        for job in self.jobs:
+            job.stop()
+
+    def pause(self):
+        for job in self.jobs:
+            job.pause()
+
+    def resume(self):
+        for job in self.jobs:
+            job.resume()
+
+    def metrics_summary(self):
+        # Wall time of the shared stages, counters and API calls summed over the targets
+        combined = RunMetrics()
+        combined.started = self.metrics.started
+        combined.elapsed = self.metrics.elapsed
+        combined.add(self.metrics.to_dict())
+        for job in self.jobs:
+            combined.add(job.metrics.to_dict(), stages=False, skip=('products',), label=job.target_lang)
+        return combined.to_dict()
+
+    def process_window(self, products, count):
+        active = [job for job in self.jobs if count > job.resumed_products]
+        if active:
+            if not all(job.wait_if_paused() for job in active):
+                raise TranslationStopped()
+            with self.metrics.stage('extract'):
+                nodes = [self.plan.nodes(product) for product in products]
+                windows = [job.prepare_window(products, nodes) for job in active]
+            self.metrics.count('products', len(products))
+            # One thread per target: each translates through its own backend and request pool
+            with self.metrics.stage('translate'):
+                if len(active) > 1:
+                    with ThreadPoolExecutor(len(active)) as pool:
+                        try:
+                            translations = list(pool.map(lambda job, window: job.translate_window(window),
+                                                         active, windows))
+                        except BaseException:
+                            # Do not wait for the other targets to finish their windows
+                            self.stop()
+                            raise
+                else:
+                    translations = [active[0].translate_window(windows[0])]
+
+            # Every target writes into the shared elements; what each one set is recorded and
+            # the original texts are put back before the next target
+            with self.metrics.stage('apply'):
+                originals = {elem: elem.text for product_nodes in nodes for elem in product_nodes}
+                edits = {}
+                for job, window, translated in zip(active, windows, translations):
+                    job.edits = {}
+                    job.apply_window(window, translated)
+                    edits[job] = job.edits
+                    job.edits = None
+                    for elem in edits[job]:
+                        elem.text = text_value(originals[elem], originals[elem])
+            variants = [edits.get(job, {}) for job in self.jobs]
+            for product, product_nodes in zip(products, nodes):
+                self._variants[product] = (product_nodes, variants)
+
+        permille = min(1000, self._input.tell() * 1000 // self._input_size) if self._input_size else 1000
+        self.on_progress(permille, 1000, f"Product {count} ({permille / 10:.1f}%)")
+        self.on_metrics(self.metrics_summary())
+
+    def render(self, product):
+        # The product as each target's output has it
+        product_nodes, variants = self._variants.pop(product, ((), ()))
+        if not any(variants):
+            return [serialize(product)] * len(self.jobs)
+        originals = {elem: text_value(elem.text, elem.text) for elem in product_nodes}
+        rendered = []
+        for variant in variants:
+            for elem, original in originals.items():
+                elem.text = variant.get(elem, original)
+            rendered.append(serialize(product))
+        return rendered
+
+    def run(self):
+        # Returns {'targets': {target: summary}, ...}; raises TranslationStopped or the underlying error
+        started = time.monotonic()
+        self.metrics = RunMetrics()
+        self._variants = {}
+        try:
+            for job in self.jobs:
+                job.begin()
+            self._input_size = self.jobs[0]._input_size
+            with self.jobs[0].open_input() as self._input, ExitStack() as stack:
+                outs = [stack.enter_context(job.open_partial_output()) for job in self.jobs]
+                writers = [_ResumeWriter(out, job.resumed_products) for job, out in zip(self.jobs, outs)]
+                for job in self.jobs:
+                    job._input = self._input
+
+                def flushed(count):
+                    for job, writer in zip(self.jobs, writers):
+                        job.flushed(writer, count)
+
+                stream_started = time.perf_counter()
+                total = stream_products(self._input, writers, self.process_window, self.window_size, flushed,
+                                        self.metrics, self.render)
+                stages = self.metrics.stages
+                self.metrics.add_time('parse', time.perf_counter() - stream_started - sum(
+                    stages.get(name, 0.0) for name in ('extract', 'translate', 'apply', 'serialize')))
+                self.metrics.finish()
+                for job in self.jobs:
+                    # Each target's metrics file also carries the shared stages
+                    for name in ('parse', 'serialize'):
+                        job.metrics.add_time(name, self.metrics.stages.get(name, 0.0))
+                summaries = {job.target_lang: job.complete(out, total) for job, out in zip(self.jobs, outs)}
+        finally:
+            self._input = None
+            self._variants = {}
+            if self.metrics.elapsed is None:
+                self.metrics.finish()
+            for job in self.jobs:
+                job.end()
+
+        fields = sum(summary['fields'] for summary in summaries.values())
+        untranslated = sum(summary['untranslated'] for summary in summaries.values())
+        return {
+            'products': total,
+            'fields': fields,
+            'untranslated': untranslated,
+            'targets': summaries,
+            'metrics': self.metrics_summary(),
+            'elapsed': round(time.monotonic() - started, 3),
+            'message': (f"Translated {total} products into {', '.join(summaries)}, {fields} fields"
+                        + (f", {untranslated} strings left untranslated" if untranslated else "")),
+        }
+
+
+def create_job(input_file, outputs, field_mapping, source_lang, delta=False, **options):
+    """A TranslationJob when outputs maps a single target language to its output file, a
+    MultiTargetJob otherwise. options are the keyword arguments both jobs take."""
+    if len(outputs) > 1:
+        return MultiTargetJob(input_file, outputs, field_mapping, source_lang, delta=delta, **options)
+    (target_lang, output_file), = outputs.items()
+    return TranslationJob(input_file, output_file, field_mapping, source_lang, target_lang,
+                          delta_state=output_file + '.delta.db' if delta else None, **options)
+
+
+class ShardError(Exception):
+    """A shard of a feed could not be translated as a document of its own."""
+
+
+def _translate_shard(shard, outputs, settings, control, events):
+    # Worker process of a ShardedJob: translates one FeedShard into a shard file per target.
+    # control['state'] carries stop/pause/resume, events the job's callbacks.
+    # The parent has evicted the memory already
+    memory = TranslationMemory(settings['memory'], evict_on_open=False)
+    try:
+        job = create_job(shard.path, outputs, settings['field_mapping'], settings['source_lang'], memory=memory,
+                         source=shard, **settings['options'])
+        jobs = job.jobs if len(outputs) > 1 else [job]
+        for target_job in jobs:
+            target_job.rate_share = settings['rate_share']
+            if target_job.target_lang in settings['delta']:
+                target_job.delta_state, target_job.delta_run = settings['delta'][target_job.target_lang]
+
+        prefix = f"[part {shard.index + 1}/{shard.count}]"
+        job.on_progress = lambda current, total, message: events.put(('progress', shard.index, current))
+        job.on_field_progress = lambda message: events.put(('field_progress', f"{prefix} {message}"))
+        job.on_notice = lambda message: events.put(('notice', f"{prefix} {message}"))
+        job.on_metrics = lambda metrics: events.put(('metrics', shard.index, metrics))
+        job.on_paused = lambda: events.put(('paused',))
+        job.on_resumed = lambda: events.put(('resumed',))
+        if shard.index == 0:
+            job.on_samples = lambda samples: events.put(('samples', samples))
+
+        finished = threading.Event()
+
+        def follow():
+            state = 'running'
+            while not finished.wait(0.2):
+                try:
+                    current = control['state']
+                except (OSError, EOFError):
+                    break
+                if current == state:
+                    continue
+                state = current
+                if state == 'stopped':
+                    job.stop()
+                elif state == 'paused':
+                    job.pause()
+                else:
+                    job.resume()
+
+        follower = threading.Thread(target=follow, daemon=True)
+        follower.start()
+        try:
+            result = job.run()
+        except etree.XMLSyntaxError as e:
+            raise ShardError(f"part {shard.index + 1} of {shard.count}: {str(e)}")
+        finally:
+            finished.set()
+            follower.join()
+        targets = result['targets'] if len(outputs) > 1 else {jobs[0].target_lang: result}
+        return {'products': result['products'], 'targets': targets, 'metrics': result['metrics']}
+    finally:
+        memory.close()
+
+
+class ShardedJob:
+    """Translates one feed in several worker processes, so parsing, extraction and
+    serialization scale with the cores. split_feed() cuts the feed on <product> boundaries,
+    each shard is translated by a TranslationJob (MultiTargetJob for several targets) in a
+    process of its own, and the translated shards are merged in order into the outputs.
+    The processes share the translation memory file and divide the request rate.
+
+    Takes the arguments of MultiTargetJob plus the number of processes. run() returns the
+    summary of a TranslationJob for a single target, of a MultiTargetJob otherwise. With one
+    process, and for feeds that cannot be split, the feed is translated in the calling
+    process; the GUI and the command line run every job through this class."""
+
+    def __init__(self, input_file, outputs, field_mapping, source_lang, memory=None, concurrency=4,
+                 requests_per_second=5.0, resume=True, delta=False, id_field=None, backend='google',
+                 backend_options=None, processes=None, prefilter=None):
+        self.input_file = input_file
+        self.outputs = dict(outputs)
+        self.field_mapping = field_mapping
+        self.source_lang = source_lang
+        self.memory = memory
+        self.concurrency = concurrency
+        self.requests_per_second = requests_per_second
+        self.resume_enabled = resume
+        self.delta = delta
+        self.id_field = id_field
+        self.backend = backend
+        self.backend_options = backend_options or {}
+        self.processes = processes or os.cpu_count() or 1
+        self.prefilter = prefilter
+        self.metrics = RunMetrics()
+        self._job = None
+        self._state = 'running'
+        self._shard_metrics = {}
+        self._summary_metrics = None
+        self.on_progress = lambda current, total, message: None
+        self.on_field_progress = lambda message: None
+        self.on_samples = lambda samples: None
+        self.on_metrics = lambda metrics: None
+        self.on_notice = lambda message: None
+        self.on_paused = lambda: None
+        self.on_resumed = lambda: None
+
+    def stop(self):
+        self._state = 'stopped'
+        if self._job:
+            self._job.stop()
+
+    def pause(self):
+        if self._state != 'stopped':
+            self._state = 'paused'
+        if self._job:
+            self._job.pause()
+
+    def resume(self):
+        if self._state != 'stopped':
+            self._state = 'running'
+        if self._job:
+            self._job.resume()
+
+    def metrics_summary(self):
+        if self._job:
+            return self._job.metrics_summary()
+        if self._summary_metrics:
+            return self._summary_metrics
+        # While the shards run: their latest metrics summed, over the wall time so far
+        combined = RunMetrics()
+        combined.started = self.metrics.started
+        for index, summary in sorted(self._shard_metrics.items()):
+            combined.add(summary, label=f"part {index + 1}")
+        return combined.to_dict()
+
+    @staticmethod
+    def shard_file(output_file, shard):
+        return f"{output_file}.shard{shard.index + 1}of{shard.count}"
+
+    def run(self):
+        # Returns a summary dict; raises TranslationStopped or the underlying error
+        self._job = None
+        self._shard_metrics = {}
+        self._summary_metrics = None
+        shards = split_feed(self.input_file, self.processes) if self.processes > 1 else []
+        if len(shards) > 1:
+            try:
+                return self.run_shards(shards)
+            except ShardError as e:
+                self.remove_shard_files(shards, partial=True)
+                self.on_notice(f"Could not translate {os.path.basename(self.input_file)} in parts ({str(e)}), "
+                               f"translating it in one process")
+        return self.run_single()
+
+    def job_options(self):
+        # Keyword arguments of the TranslationJob or MultiTargetJob doing the work
+        return {
+            'concurrency': self.concurrency,
+            'requests_per_second': self.requests_per_second,
+            'resume': self.resume_enabled,
+            'id_field': self.id_field,
+            'backend': self.backend,
+            'backend_options': self.backend_options,
+            'prefilter': self.prefilter,
+        }
+
+    def run_single(self):
+        job = create_job(self.input_file, self.outputs, self.field_mapping, self.source_lang, delta=self.delta,
+                         memory=self.memory, **self.job_options())
+        for name in ('on_progress', 'on_field_progress', 'on_samples', 'on_metrics', 'on_notice',
+                     'on_paused', 'on_resumed'):
+            setattr(job, name, getattr(self, name))
+        self._job = job
+        if self._state == 'stopped':
+            job.stop()
+        elif self._state == 'paused':
+            job.pause()
+        return job.run()
+
+    def run_shards(self, shards):
+        started = time.monotonic()
+        self.metrics = RunMetrics()
+        first_output = next(iter(self.outputs.values()))
+        if self.memory is not None and self.memory.path != ':memory:':
+            memory_path, temporary_memory = self.memory.path, None
+        else:
+            # The processes still share the translations of this run
+            memory_path = temporary_memory = first_output + '.memory.db'
+        delta = {}
+        if self.delta:
+            for target_lang, output_file in self.outputs.items():
+                scope = delta_scope(self.field_mapping, self.source_lang, target_lang, self.id_field,
+                                    PreFilter.from_config(self.prefilter, target_lang), self.backend)
+                state = DeltaState(output_file + '.delta.db', scope)
+                delta[target_lang] = (state.path, state.run)
+                state.close()
+        settings = {
+            'field_mapping': self.field_mapping,
+            'source_lang': self.source_lang,
+            'memory': memory_path,
+            'rate_share': 1.0 / len(shards),
+            'delta': delta,
+            'options': self.job_options(),
+        }
+        shard_outputs = [{target_lang: self.shard_file(output_file, shard)
+                          for target_lang, output_file in self.outputs.items()} for shard in shards]
+        results = [None] * len(shards)
+        progress = [0] * len(shards)
+        sizes = [shard.size() for shard in shards]
+        error = None
+        # spawn: the GUI calls this from a thread, forking a threaded process is unsafe
+        context = multiprocessing.get_context('spawn')
+        try:
+            try:
+                with context.Manager() as manager, ProcessPoolExecutor(len(shards), mp_context=context) as pool:
+                    control = manager.dict(state=self._state)
+                    events = manager.Queue()
+                    futures = {pool.submit(_translate_shard, shard, outputs, settings, control, events): shard.index
+                               for shard, outputs in zip(shards, shard_outputs)}
+                    pending = set(futures)
+                    while pending:
+                        done, pending = wait(pending, timeout=0.1)
+                        for future in done:
+                            try:
+                                results[futures[future]] = future.result()
+                            except Exception as e:
+                                # A failed shard stops the others; a real error wins over their TranslationStopped
+                                if error is None or isinstance(error, TranslationStopped):
+                                    error = e
+                        state = 'stopped' if error else self._state
+                        if control['state'] != state:
+                            control['state'] = state
+                        self.dispatch(events, progress, sizes)
+                    self.dispatch(events, progress, sizes)
+            finally:
+                if temporary_memory:
+                    for suffix in ('', '-wal', '-shm'):
+                        try:
+                            os.remove(temporary_memory + suffix)
+                        except OSError:
+                            pass
+            if error:
+                raise error
+
+            for target_lang, output_file in self.outputs.items():
+                out = open(output_file + '.part', 'wb', buffering=OUTPUT_BUFFER_SIZE)
+                try:
+                    merge_shards([outputs[target_lang] for outputs in shard_outputs], out)
+                except BaseException:
+                    out.close()
+                    raise
+                replace_file(out, output_file)
+        finally:
+            # Stopped and failed runs get their metrics file too, like a TranslationJob's
+            target_metrics = self.write_metrics(shards, results, started)
+        self.remove_shard_files(shards)
+        return self.complete(shards, results, delta, started, target_metrics)
+
+    def dispatch(self, events, progress, sizes):
+        # Hands the events of the worker processes to the callbacks
+        while True:
+            try:
+                event = events.get_nowait()
+            except Empty:
+                return
+            kind = event[0]
+            if kind == 'progress':
+                progress[event[1]] = event[2]
+                permille = sum(done * size for done, size in zip(progress, sizes)) // sum(sizes)
+                self.on_progress(permille, 1000, f"{permille / 10:.1f}% ({len(sizes)} processes)")
+            elif kind == 'metrics':
+                self._shard_metrics[event[1]] = event[2]
+                self.on_metrics(self.metrics_summary())
+            else:
+                getattr(self, 'on_' + kind)(*event[1:])
+
+    def remove_shard_files(self, shards, partial=False):
+        for shard in shards:
+            for output_file in self.outputs.values():
+                shard_file = self.shard_file(output_file, shard)
+                suffixes = ('', '.metrics.json', '.part', '.journal') if partial else ('', '.metrics.json')
+                for suffix in suffixes:
+                    try:
+                        os.remove(shard_file + suffix)
+                    except OSError:
+                        pass
+
+    def write_metrics(self, shards, results, started):
+        # Combines the metrics of the parts into each output's metrics file and removes theirs.
+        # A part without a result (stopped or failed) still left its metrics file. Returns
+        # {target: RunMetrics}.
+        combined = {}
+        for target_lang, output_file in self.outputs.items():
+            metrics = RunMetrics()
+            metrics.started = started
+            for shard, result in zip(shards, results):
+                shard_metrics_file = self.shard_file(output_file, shard) + '.metrics.json'
+                if result is not None:
+                    part = result['targets'][target_lang]['metrics']
+                else:
+                    try:
+                        with open(shard_metrics_file, encoding='utf-8') as f:
+                            part = json.load(f)
+                    except (OSError, ValueError):
+                        part = None
+                if part:
+                    metrics.add(part, label=f"part {shard.index + 1}")
+                try:
+                    os.remove(shard_metrics_file)
+                except OSError:
+                    pass
+            metrics.finish()
+            metrics_file = output_file + '.metrics.json'
+            try:
+                metrics.write(metrics_file)
+            except OSError as e:
+                self.on_notice(f"Could not write {metrics_file}: {str(e)}")
+            combined[target_lang] = metrics
+        return combined
+
+    def complete(self, shards, results, delta, started, target_metrics):
+        # Combines the shard summaries into the summary of the whole feed
+        summaries = {}
+        for target_lang, output_file in self.outputs.items():
+            parts = [result['targets'][target_lang] for result in results]
+            resumed = sum(part['resumed_products'] for part in parts)
+            if target_lang in delta and not resumed:
+                path, run = delta[target_lang]
+                scope = delta_scope(self.field_mapping, self.source_lang, target_lang, self.id_field,
+                                    PreFilter.from_config(self.prefilter, target_lang), self.backend)
+                state = DeltaState(path, scope, run)
+                state.prune()
+                state.close()
+            metrics = target_metrics[target_lang]
+            total = sum(part['products'] for part in parts)
+            fields = sum(part['fields'] for part in parts)
+            unchanged = sum(part['unchanged_products'] for part in parts)
+            untranslated = sum(part['untranslated'] for part in parts)
+            hits = sum(part['memory']['hits'] for part in parts)
+            misses = sum(part['memory']['misses'] for part in parts)
+            # Each part remembers the values it kept back on its own, so a value repeated in
+            # several parts counts as a saved request in each of them
+            saved = metrics.counters.get('prefilter_saved_calls', 0)
+            summaries[target_lang] = {
+                'products': total,
+                'fields': fields,
+                'resumed_products': resumed,
+                'unchanged_products': unchanged,
+                'untranslated': untranslated,
+                'memory': {'hits': hits, 'misses': misses,
+                           'hit_rate': hits / (hits + misses) if hits + misses else 0.0},
+                'metrics': metrics.to_dict(),
+                'metrics_file': output_file + '.metrics.json',
+                'elapsed': round(time.monotonic() - started, 3),
+                'message': (f"Translated {total} products, {fields} fields in {len(shards)} processes"
+                            + (f", {unchanged} unchanged products reused" if self.delta else "")
+                            + (f", {untranslated} strings left untranslated" if untranslated else "")
+                            + (f", {saved} requests saved by the pre-filter (summed over the parts)" if saved else "")
+                            + f" (translation memory: {hits} hits, {misses} misses)"),
+            }
+
+        self.metrics.started = started
+        for k, result in enumerate(results):
+            self.metrics.add(result['metrics'], label=f"part {k + 1}")
+        self.metrics.finish()
+        self._summary_metrics = self.metrics.to_dict()
+        if len(summaries) == 1:
+            summary, = summaries.values()
+            return summary
+        total = sum(result['products'] for result in results)
+        fields = sum(summary['fields'] for summary in summaries.values())
+        untranslated = sum(summary['untranslated'] for summary in summaries.values())
+        return {
+            'products': total,
+            'fields': fields,
+            'untranslated': untranslated,
+            'targets': summaries,
+            'metrics': self._summary_metrics,
+            'elapsed': round(time.monotonic() - started, 3),
+            'message': (f"Translated {total} products into {', '.join(summaries)}, {fields} fields "
+                        f"in {len(shards)} processes"
+                        + (f", {untranslated} strings left untranslated" if untranslated else "")),
+        }
@@ -1,16 +1,19 @@
 import sys
 from PyQt5.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
-                             QLabel, QLineEdit, QPushButton, QTextEdit, QFileDialog,
-                             QProgressBar, QMessageBox, QCheckBox, QGroupBox, QTreeWidget,
-                             QTreeWidgetItem, QHeaderView, QComboBox, QDialog, QTableWidget,
-                             QTableWidgetItem)
-from PyQt5.QtCore import QThread, pyqtSignal, Qt
-from bs4 import BeautifulSoup, NavigableString
-from deep_translator import GoogleTranslator
-import time
-import re
+                             QLabel, QLineEdit, QPushButton, QPlainTextEdit, QFileDialog,
+                             QProgressBar, QMessageBox, QCheckBox, QGroupBox, QTableView,
+                             QHeaderView, QComboBox, QDialog, QTableWidget, QAbstractItemView,
+                             QTableWidgetItem, QSpinBox, QDoubleSpinBox)
+from PyQt5.QtCore import QThread, QTimer, pyqtSignal, Qt, QAbstractItemModel, QModelIndex, QSortFilterProxyModel
+from xml_translator_core import (ShardedJob, TranslationMemory, TranslationStopped, detect_fields,
+                                 language_output_path, load_field_mapping, load_prefilter_config,
+                                 save_field_mapping)
+from xml_translator_backends import BACKENDS, parse_backend_options
+import fnmatch
 import os
-from html import unescape
+import re
+import threading
+import time
 
 
 class PreviewDialog(QDialog):
@@ -50,169 +53,251 @@ class FieldMapper(QThread):
         
     def run(self):
         try:
-            if not os.path.exists(self.file_path):
-                self.fields_detected.emit([])
-                return
-                
-            with open(self.file_path, 'r', encoding='utf-8') as f:
-                soup = BeautifulSoup(f, 'lxml-xml')
-                
-            sample_product = soup.find('product')
-            if not sample_product:
-                self.fields_detected.emit([])
-                return
-                
-            fields = []
-            # Standard fields
-            for child in sample_product.children:
-                if child.name and child.name not in ['[document]', 'product']:
-                    fields.append({
-                        'name': child.name,
-                        'path': f"/product/{child.name}",
-                        'sample': str(child.string)[:50] + ("..." if len(str(child.string)) > 50 else "")
-                    })
-                    
-            # Nested fields
-            for tag in sample_product.find_all(True):
-                if tag.name == 'category':
-                    fields.append({
-                        'name': 'category',
-                        'path': f"//category",
-                        'sample': str(tag.string)[:50] + ("..." if len(str(tag.string)) > 50 else "")
-                    })
-                elif tag.name == 'attribute':
-                    attr_name = tag.find('name')
-                    if attr_name and attr_name.string:
-                        fields.append({
-                            'name': f"attribute/{attr_name.string}",
-                            'path': f"//attribute[name='{attr_name.string}']/label",
-                            'sample': tag.find('label').string[:50] if tag.find('label') else ""
-                        })
-            
-            self.fields_detected.emit(fields)
-            
+            self.fields_detected.emit(detect_fields(self.file_path))
         except Exception as e:
             print(f"Field detection error: {str(e)}")
             self.fields_detected.emit([])
 
+class FieldModel(QAbstractItemModel):
+    """The detected fields as a flat item model. Rows are only the field dicts and a check
+    flag each; the view asks for the cells it shows, so tens of thousands of fields cost
+    no widgets or items."""
+
+    HEADERS = ["Field Name", "XPath", "Sample Content", "Translate", "Products"]
+    NAME, PATH, SAMPLE, TRANSLATE, PRODUCTS = range(5)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.fields = []
+        self.checked = bytearray()
+
+    def set_fields(self, fields, checked=True):
+        self.beginResetModel()
+        self.fields = list(fields)
+        self.checked = bytearray([checked]) * len(self.fields)
+        self.endResetModel()
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not 0 <= row < len(self.fields) or not 0 <= column < len(self.HEADERS):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.fields)
+
+    def columnCount(self, parent=QModelIndex()):
+        return len(self.HEADERS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if orientation == Qt.Horizontal and role == Qt.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        field = self.fields[index.row()]
+        column = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == self.NAME:
+                return field['name']
+            if column == self.PATH:
+                return field['path']
+            if column == self.SAMPLE:
+                return field.get('sample', '')
+            if column == self.PRODUCTS:
+                return str(field.get('count', ''))
+        elif role == Qt.CheckStateRole and column == self.TRANSLATE:
+            return Qt.Checked if self.checked[index.row()] else Qt.Unchecked
+        elif role == Qt.ToolTipRole and column == self.SAMPLE:
+            return "\n".join(field.get('samples', []))
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        if role == Qt.CheckStateRole and index.column() == self.TRANSLATE:
+            self.checked[index.row()] = value == Qt.Checked
+        elif role == Qt.EditRole and index.column() == self.NAME and str(value).strip():
+            self.fields[index.row()]['name'] = str(value).strip()
+        else:
+            return False
+        self.dataChanged.emit(index, index, [role])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        if index.column() == self.NAME:
+            flags |= Qt.ItemIsEditable
+        elif index.column() == self.TRANSLATE:
+            flags |= Qt.ItemIsUserCheckable
+        return flags
+
+    @staticmethod
+    def matcher(text):
+        # Case-insensitive test on name and path: a glob when text has wildcards, else a substring
+        text = text.strip().lower()
+        if not text:
+            return None
+        if any(char in text for char in '*?['):
+            return re.compile(fnmatch.translate(text)).match
+        return lambda value: text in value
+
+    def row_matches(self, row, match):
+        # The last part of the name counts too, so attr* finds attribute/attr1
+        field = self.fields[row]
+        name = field['name'].lower()
+        return bool(match(name) or match(field['path'].lower()) or match(name.rsplit('/', 1)[-1]))
+
+    def set_checked(self, pattern, checked):
+        # Checks or unchecks the fields matching pattern (all when empty); returns how many
+        match = self.matcher(pattern)
+        count = 0
+        for row in range(len(self.fields)):
+            if match is None or self.row_matches(row, match):
+                self.checked[row] = checked
+                count += 1
+        if self.fields:
+            self.dataChanged.emit(self.index(0, self.TRANSLATE), self.index(len(self.fields) - 1, self.TRANSLATE),
+                                  [Qt.CheckStateRole])
+        return count
+
+    def selected_fields(self):
+        return [{'name': field['name'], 'path': field['path'], 'sample': field.get('sample', '')}
+                for field, checked in zip(self.fields, self.checked) if checked]
+
+    def apply_mapping(self, mapping):
+        # Checks exactly the fields of a saved mapping, taking over their names; fields the
+        # feed did not show in detection are added. Returns the number of added fields.
+        by_path = {field['path']: row for row, field in enumerate(self.fields)}
+        added = [dict(field, sample='', samples=[], count='') for field in mapping if field['path'] not in by_path]
+        self.beginResetModel()
+        self.checked = bytearray(len(self.fields))
+        for field in mapping:
+            row = by_path.get(field['path'])
+            if row is not None:
+                self.fields[row]['name'] = field['name']
+                self.checked[row] = True
+        self.fields.extend(added)
+        self.checked.extend(b'\x01' * len(added))
+        self.endResetModel()
+        return len(added)
+
+
+class FieldFilterModel(QSortFilterProxyModel):
+    # Shows the fields whose name or path matches the filter text (see FieldModel.matcher)
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._match = None
+
+    def set_filter(self, text):
+        self._match = FieldModel.matcher(text)
+        self.invalidateFilter()
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        return self._match is None or self.sourceModel().row_matches(source_row, self._match)
+
+
 class TranslationWorker(QThread):
+    # Progress, field and statistics updates reach the UI at most this often (seconds)
+    UPDATE_INTERVAL = 0.1
+
     progress = pyqtSignal(int, int, str)
     finished = pyqtSignal(bool, str)
     field_progress = pyqtSignal(str)
     sample_ready = pyqtSignal(list)  # For preview samples
     paused = pyqtSignal()
+    resumed = pyqtSignal()
+    notice = pyqtSignal(str)  # Warnings that must reach the log, not coalesced
+    stats_updated = pyqtSignal(dict)
 
-    def __init__(self, input_file, output_file, field_mapping, source_lang, target_lang):
+    def __init__(self, input_file, output_file, field_mapping, source_lang, target_lang, memory=None,
+                 concurrency=4, requests_per_second=5.0, delta=False, backend='google', backend_options=None,
+                 processes=1, prefilter=None):
         super().__init__()
-        self.input_file = input_file
-        self.output_file = output_file
-        self.field_mapping = field_mapping
-        self.source_lang = source_lang
-        self.target_lang = target_lang
-        self._is_running = True
-        self._is_paused = False
-        self.samples = []
+        # Several targets get one output each next to output_file; with processes > 1 the feed
+        # is split, translated in several processes and merged
+        targets = target_lang if isinstance(target_lang, (list, tuple)) else [target_lang]
+        outputs = ({target: language_output_path(output_file, target) for target in targets}
+                   if len(targets) > 1 else {targets[0]: output_file})
+        self.job = ShardedJob(input_file, outputs, field_mapping, source_lang, memory=memory,
+                              concurrency=concurrency, requests_per_second=requests_per_second, delta=delta,
+                              backend=backend, backend_options=backend_options, processes=processes,
+                              prefilter=prefilter)
+        self.job.on_progress = lambda *args: self.coalesce('progress', args)
+        self.job.on_field_progress = lambda message: self.coalesce('field_progress', (message,))
+        self.job.on_samples = self.sample_ready.emit
+        self.job.on_metrics = lambda metrics: self.coalesce('stats_updated', (metrics,))
+        self.job.on_notice = self.notice.emit
+        self.job.on_paused = self.paused.emit
+        self.job.on_resumed = self.resumed.emit
+        self._updates_lock = threading.Lock()
+        self._pending_updates = {}
+        self._last_update = {}
+        # Runs on the GUI thread: delivers what coalesce() held back once updates stop coming
+        self._flush_timer = QTimer(self)
+        self._flush_timer.setInterval(int(self.UPDATE_INTERVAL * 1000))
+        self._flush_timer.timeout.connect(self.flush_updates)
+        self._flush_timer.start()
+        self.finished.connect(self._flush_timer.stop)
+
+    def coalesce(self, signal, args):
+        # Keep the latest update of each signal and emit it at most every UPDATE_INTERVAL,
+        # so the number of cross-thread signals does not grow with the size of the feed
+        now = time.monotonic()
+        with self._updates_lock:
+            _, count = self._pending_updates.get(signal, (None, 0))
+            self._pending_updates[signal] = (args, count + 1)
+            if now - self._last_update.get(signal, 0.0) < self.UPDATE_INTERVAL:
+                return
+            self._last_update[signal] = now
+            args, count = self._pending_updates.pop(signal)
+        self.emit_update(signal, args, count)
+
+    def flush_updates(self):
+        now = time.monotonic()
+        with self._updates_lock:
+            pending, self._pending_updates = self._pending_updates, {}
+            for signal in pending:
+                self._last_update[signal] = now
+        for signal, (args, count) in pending.items():
+            self.emit_update(signal, args, count)
+
+    def emit_update(self, signal, args, count):
+        if signal == 'field_progress' and count > 1:
+            args = (f"{args[0]} (and {count - 1} earlier, not shown)",)
+        getattr(self, signal).emit(*args)
 
     def stop(self):
-        self._is_running = False
+        self.job.stop()
         
     def pause(self):
-        self._is_paused = True
+        self.job.pause()
         self.paused.emit()
         
     def resume(self):
-        self._is_paused = False
-
-    def translate_text(self, text):
-        if not text or not text.strip():
-            return text
-            
-        try:
-            if re.match(r'^[A-Z0-9\s\-_\.\/]+$', text.strip()):
-                return text
-                
-            return GoogleTranslator(source=self.source_lang, target=self.target_lang).translate(text) 
-        except Exception as e:
-            print(f"Field detection error: {str(e)}")
-            return text
-
-    def get_field_content(self, product, field):
-        if field['path'].startswith('/product/'):
-            tag_name = field['path'].split('/')[-1]
-            tag = product.find(tag_name)
-            return str(tag.string) if tag and tag.string else None
-        elif field['path'].startswith('//category'):
-            category = product.find('category')
-            return str(category.string) if category and category.string else None
-        elif field['path'].startswith('//attribute'):
-            attr_name = field['name'].split('/')[-1]
-            attr = product.find('attribute', {'name': attr_name})
-            label = attr.find('label') if attr else None
-            return str(label.string) if label and label.string else None
-        return None
+        self.job.resume()
+        self.resumed.emit()
 
     def run(self):
         try:
-            with open(self.input_file, 'r', encoding='utf-8') as f:
-                soup = BeautifulSoup(f, 'lxml-xml')
-
-            products = soup.find_all('product')
-            total = len(products)
-            
-            for i, product in enumerate(products):
-                while self._is_paused:
-                    time.sleep(0.5)
-                if not self._is_running:
-                    self.finished.emit(False, "Translation stopped by user")
-                    return
-                
-                self.progress.emit(i+1, total, f"Product {i+1}/{total}")
-                # Collect samples for first 5 products
-                samples = []
-                if i < 5:
-                    for field in self.field_mapping:
-                        original = self.get_field_content(product, field)
-                        if original:
-                            translated = self.translate_text(original)
-                            samples.append((field['name'], original, translated))
-                    self.sample_ready.emit(samples)
-            
-                # Process each selected field
-                for field in self.field_mapping:
-                    self.field_progress.emit(f"Translating {field['path']}")
-                    
-                    if field['path'].startswith('/product/'):
-                        tag_name = field['path'].split('/')[-1]
-                        for tag in product.find_all(tag_name):
-                            if tag.string:
-                                translated = self.translate_text(str(tag.string))
-                                tag.string.replace_with(NavigableString(translated))
-                    
-                    elif field['path'].startswith('//category'):
-                        for category in product.find_all('category'):
-                            if category.string:
-                                translated = self.translate_text(str(category.string))
-                                category.string.replace_with(NavigableString(translated))
-                    
-                    elif field['path'].startswith('//attribute'):
-                        attr_name = field['name'].split('/')[-1]
-                        for attr in product.find_all('attribute'):
-                            if attr.find('name') and attr.find('name').string == attr_name:
-                                label = attr.find('label')
-                                if label and label.string:
-                                    translated = self.translate_text(str(label.string))
-                                    label.string.replace_with(NavigableString(translated))
-                
-                time.sleep(0.3)
-            
-            with open(self.output_file, 'w', encoding='utf-8') as f:
-                f.write(unescape(str(soup))) 
-            self.finished.emit(True, f"Translated {total} products")
-            
+            success, message = True, self.job.run()['message']
+        except TranslationStopped:
+            success, message = False, "Translation stopped by user, start it again to resume"
         except Exception as e:
-            self.finished.emit(False, f"Error: {str(e)}")
+            success, message = False, f"Error: {str(e)}"
+        self.flush_updates()
+        self.stats_updated.emit(self.job.metrics_summary())
+        self.finished.emit(success, message)
 
 class TranslationApp(QMainWindow):
+    LOG_LINES = 2000
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("XML Field Mapping Translator")
@@ -220,6 +305,7 @@ class TranslationApp(QMainWindow):
         self.worker = None
         self.field_mapper = None
         self.detected_fields = []
+        self.memory = None
         self.init_ui()
         
     def init_ui(self):
@@ -239,7 +325,57 @@ class TranslationApp(QMainWindow):
         lang_layout.addWidget(self.source_lang)
         lang_layout.addWidget(QLabel("Target Language:"))
         lang_layout.addWidget(self.target_lang)
+        self.extra_targets = QLineEdit()
+        self.extra_targets.setPlaceholderText("also: de, fr")
+        self.extra_targets.setToolTip("More target languages, translated in the same pass; each language is "
+                                      "written next to the output file as <name>_<language>.xml")
+        lang_layout.addWidget(self.extra_targets)
+        self.backend = QComboBox()
+        self.backend.addItems(sorted(BACKENDS))
+        self.backend.setCurrentText("google")
+        self.backend_options = QLineEdit()
+        self.backend_options.setPlaceholderText("key=value, ...")
+        self.backend_options.setToolTip("Backend options, e.g. url=http://mt-server:5000 for libretranslate "
+                                        "or latency=0.2, failure_rate=0.05 for local")
+
+        lang_layout.addWidget(QLabel("Translator:"))
+        lang_layout.addWidget(self.backend)
+        lang_layout.addWidget(self.backend_options)
+        self.use_memory = QCheckBox("Use translation memory")
+        self.use_memory.setChecked(True)
+        lang_layout.addWidget(self.use_memory)
         lang_group.setLayout(lang_layout)
+
+        # Throughput Settings
+        speed_group = QGroupBox("Throughput")
+        speed_layout = QHBoxLayout()
+
+        self.concurrency = QSpinBox()
+        self.concurrency.setRange(1, 32)
+        self.concurrency.setValue(4)
+        self.rate_limit = QDoubleSpinBox()
+        self.rate_limit.setRange(0.5, 100.0)
+        self.rate_limit.setSingleStep(0.5)
+        self.rate_limit.setValue(5.0)
+        self.rate_limit.setToolTip("Upper limit; the rate is lowered automatically while the translator throttles")
+        self.processes = QSpinBox()
+        self.processes.setRange(1, os.cpu_count() or 1)
+        self.processes.setValue(1)
+        self.processes.setToolTip("Splits large feeds into parts translated in separate processes; "
+                                  "the request rate is shared between them")
+
+        speed_layout.addWidget(QLabel("Parallel requests:"))
+        speed_layout.addWidget(self.concurrency)
+        speed_layout.addWidget(QLabel("Max requests per second:"))
+        speed_layout.addWidget(self.rate_limit)
+        speed_layout.addWidget(QLabel("Processes:"))
+        speed_layout.addWidget(self.processes)
+        self.delta_mode = QCheckBox("Only translate new/changed products")
+        self.delta_mode.setToolTip("Reuses the translations of the previous run of this output file "
+                                   "for products whose selected fields did not change")
+        speed_layout.addWidget(self.delta_mode)
+        speed_layout.addStretch()
+        speed_group.setLayout(speed_layout)
         
         # File Selection
         file_group = QGroupBox("File Selection")
@@ -266,24 +402,79 @@ class TranslationApp(QMainWindow):
         output_layout.addWidget(self.output_path)
         output_layout.addWidget(self.output_browse)
         
+        # Glossary / do-not-translate rules
+        prefilter_layout = QHBoxLayout()
+        self.prefilter_path = QLineEdit()
+        self.prefilter_path.setPlaceholderText("optional JSON file: rules, patterns, protect, terms")
+        self.prefilter_path.setToolTip("Values matching the do-not-translate rules are never sent to the translator; "
+                                       "glossary terms are kept as they are or always translated the same way")
+        self.prefilter_browse = QPushButton("Browse...")
+        self.prefilter_browse.clicked.connect(self.browse_prefilter)
+        prefilter_layout.addWidget(QLabel("Glossary:"))
+        prefilter_layout.addWidget(self.prefilter_path)
+        prefilter_layout.addWidget(self.prefilter_browse)
+
         file_layout.addLayout(input_layout)
         file_layout.addLayout(output_layout)
+        file_layout.addLayout(prefilter_layout)
         file_group.setLayout(file_layout)
         
         # Field Mapping
         self.mapping_group = QGroupBox("Field Mapping (Double-click to edit)")
         self.mapping_group.setEnabled(False)
         mapping_layout = QVBoxLayout()
-        
-        self.field_tree = QTreeWidget()
-        self.field_tree.setHeaderLabels(["Field Name", "XPath", "Sample Content", "Translate"])
-        self.field_tree.setColumnWidth(0, 150)
-        self.field_tree.setColumnWidth(1, 200)
-        self.field_tree.setColumnWidth(2, 250)
-        self.field_tree.header().setSectionResizeMode(3, QHeaderView.ResizeToContents)
-        self.field_tree.itemDoubleClicked.connect(self.edit_field_item)
-        
-        mapping_layout.addWidget(self.field_tree)
+
+        filter_layout = QHBoxLayout()
+        self.field_filter = QLineEdit()
+        self.field_filter.setPlaceholderText("Filter fields, e.g. color or attribute/size*")
+        self.field_filter.setToolTip("Shows the fields whose name or path contains the text; "
+                                     "* and ? match like file name patterns")
+        # Filtering waits for a pause in typing, each pass tests every field
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(150)
+        self.filter_timer.timeout.connect(self.filter_fields)
+        self.field_filter.textChanged.connect(self.filter_timer.start)
+        self.select_shown_btn = QPushButton("Select Shown")
+        self.select_shown_btn.clicked.connect(lambda: self.check_shown_fields(True))
+        self.deselect_shown_btn = QPushButton("Deselect Shown")
+        self.deselect_shown_btn.clicked.connect(lambda: self.check_shown_fields(False))
+        filter_layout.addWidget(self.field_filter)
+        filter_layout.addWidget(self.select_shown_btn)
+        filter_layout.addWidget(self.deselect_shown_btn)
+
+        self.field_model = FieldModel(self)
+        self.field_proxy = FieldFilterModel(self)
+        self.field_proxy.setSourceModel(self.field_model)
+        # A table view lays out only the visible rows (a tree view walks all of them)
+        self.field_view = QTableView()
+        self.field_view.setModel(self.field_proxy)
+        self.field_view.setShowGrid(False)
+        self.field_view.verticalHeader().hide()
+        self.field_view.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 6)
+        self.field_view.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.field_view.setEditTriggers(QAbstractItemView.DoubleClicked)
+        self.field_view.horizontalHeader().setStretchLastSection(True)
+        self.field_view.setColumnWidth(0, 150)
+        self.field_view.setColumnWidth(1, 200)
+        self.field_view.setColumnWidth(2, 250)
+        # Fixed widths: sizing to contents would measure every row
+        self.field_view.setColumnWidth(3, 70)
+        self.field_view.setColumnWidth(4, 70)
+
+        mapping_layout.addLayout(filter_layout)
+        mapping_layout.addWidget(self.field_view)
+        mapping_buttons = QHBoxLayout()
+        self.field_count_label = QLabel()
+        self.load_mapping_btn = QPushButton("Load Mapping...")
+        self.load_mapping_btn.clicked.connect(self.load_mapping)
+        self.save_mapping_btn = QPushButton("Save Mapping...")
+        self.save_mapping_btn.clicked.connect(self.save_mapping)
+        mapping_buttons.addWidget(self.field_count_label)
+        mapping_buttons.addStretch()
+        mapping_buttons.addWidget(self.load_mapping_btn)
+        mapping_buttons.addWidget(self.save_mapping_btn)
+        mapping_layout.addLayout(mapping_buttons)
         self.mapping_group.setLayout(mapping_layout)
         
         # Progress
@@ -312,18 +503,35 @@ class TranslationApp(QMainWindow):
         button_layout.addWidget(self.preview_btn)
         
         # Log
-        self.log = QTextEdit()
+        # Plain text with a block cap: the oldest lines are dropped, so long runs do not grow the log
+        self.log = QPlainTextEdit()
         self.log.setReadOnly(True)
+        self.log.setMaximumBlockCount(self.LOG_LINES)
+
+        # Run statistics
+        stats_group = QGroupBox("Statistics")
+        stats_layout = QVBoxLayout()
+        self.stats_table = QTableWidget(0, 2)
+        self.stats_table.setHorizontalHeaderLabels(["Metric", "Value"])
+        self.stats_table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.stats_table.verticalHeader().setVisible(False)
+        self.stats_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        stats_layout.addWidget(self.stats_table)
+        stats_group.setLayout(stats_layout)
+        log_layout = QHBoxLayout()
+        log_layout.addWidget(self.log, 3)
+        log_layout.addWidget(stats_group, 2)
         
         # Assemble layout
         layout.addWidget(lang_group)
+        layout.addWidget(speed_group)
         layout.addWidget(file_group)
         layout.addWidget(self.mapping_group)
         layout.addWidget(self.progress_bar)
         layout.addWidget(self.progress_label)
         layout.addWidget(self.field_label)
         layout.addLayout(button_layout)
-        layout.addWidget(self.log)
+        layout.addLayout(log_layout)
         
         main_widget.setLayout(layout)
         self.setCentralWidget(main_widget)
@@ -343,13 +551,18 @@ class TranslationApp(QMainWindow):
         if path:
             self.output_path.setText(path)
             
+    def browse_prefilter(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Select Glossary", "", "JSON Files (*.json)")
+        if path:
+            self.prefilter_path.setText(path)
+
     def analyze_fields(self):
         path = self.input_path.text()
         if not path or not os.path.exists(path):
             return
             
         self.mapping_group.setEnabled(False)
-        self.field_tree.clear()
+        self.field_model.set_fields([])
         self.log_message("Analyzing XML structure...")
         
         if self.field_mapper:
@@ -361,51 +574,61 @@ class TranslationApp(QMainWindow):
         
     def populate_field_tree(self, fields):
         self.detected_fields = fields
-        self.field_tree.clear()
-        
+        self.field_model.set_fields(fields)
+        self.update_field_count()
+
         if not fields:
             self.log_message("No fields detected in XML")
             return
-            
-        for field in fields:
-            item = QTreeWidgetItem(self.field_tree)
-            item.setText(0, field['name'])
-            item.setText(1, field['path'])
-            item.setText(2, field['sample'])
-            
-            # Add checkbox for translation selection
-            cb = QCheckBox()
-            cb.setChecked(True)
-            self.field_tree.setItemWidget(item, 3, cb)
-            
+
         self.mapping_group.setEnabled(True)
         self.translate_btn.setEnabled(True)
         self.log_message(f"Detected {len(fields)} fields in XML")
-        
-    def edit_field_item(self, item, column):
-        if column == 0:  # Only allow editing field name
-            item.setFlags(item.flags() | Qt.ItemIsEditable)
-        else:
-            item.setFlags(item.flags() & ~Qt.ItemIsEditable)
-            
+
+    def filter_fields(self):
+        self.field_proxy.set_filter(self.field_filter.text())
+        self.update_field_count()
+
+    def check_shown_fields(self, checked):
+        if self.filter_timer.isActive():
+            self.filter_timer.stop()
+            self.filter_fields()
+        count = self.field_model.set_checked(self.field_filter.text(), checked)
+        self.log_message(f"{'Selected' if checked else 'Deselected'} {count} fields")
+
+    def update_field_count(self):
+        shown, total = self.field_proxy.rowCount(), self.field_model.rowCount()
+        self.field_count_label.setText(f"{total} fields" if shown == total else f"{shown} of {total} fields shown")
+
     def get_selected_fields(self):
-        selected = []
-        for i in range(self.field_tree.topLevelItemCount()):
-            item = self.field_tree.topLevelItem(i)
-            cb = self.field_tree.itemWidget(item, 3)
-            if cb.isChecked():
-                field_name = item.text(0)
-                path = item.text(1)
-                sample = item.text(2)
-                selected.append({
-                    'name': field_name,
-                    'path': path,
-                    'sample': sample
-                })
-        return selected
-        
+        return self.field_model.selected_fields()
+
+    def load_mapping(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Load Field Mapping", "", "Field Mapping (*.json)")
+        if not path:
+            return
+        try:
+            mapping = load_field_mapping(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "Warning", f"Could not load {path}: {str(e)}")
+            return
+        added = self.field_model.apply_mapping(mapping)
+        self.update_field_count()
+        self.log_message(f"Loaded {len(mapping)} fields from {path}"
+                         + (f", {added} of them not among the detected fields" if added else ""))
+
+    def save_mapping(self):
+        fields = self.get_selected_fields()
+        if not fields:
+            QMessageBox.warning(self, "Warning", "Please select at least one field to save")
+            return
+        path, _ = QFileDialog.getSaveFileName(self, "Save Field Mapping", "", "Field Mapping (*.json)")
+        if path:
+            save_field_mapping(path, fields)
+            self.log_message(f"Saved {len(fields)} fields to {path}")
+
     def log_message(self, message):
-        self.log.append(message)
+        self.log.appendPlainText(message)
         
     def start_translation(self):
         input_file = self.input_path.text()
@@ -413,6 +636,8 @@ class TranslationApp(QMainWindow):
         field_mapping = self.get_selected_fields()
         source_lang = self.source_lang.currentText()
         target_lang = self.target_lang.currentText()
+        extra = [lang.strip() for lang in self.extra_targets.text().split(',') if lang.strip()]
+        targets = list(dict.fromkeys([target_lang] + [lang for lang in extra if lang != source_lang]))
         
         if not field_mapping:
             QMessageBox.warning(self, "Warning", "Please select at least one field to translate")
@@ -425,21 +650,58 @@ class TranslationApp(QMainWindow):
         if not os.path.exists(input_file):
             QMessageBox.warning(self, "Warning", "Input file does not exist")
             return
-            
+
+        try:
+            backend_options = parse_backend_options(
+                [item for item in self.backend_options.text().split(',') if item.strip()])
+        except ValueError as e:
+            QMessageBox.warning(self, "Warning", f"Invalid backend options: {str(e)}")
+            return
+
+        prefilter = None
+        if self.prefilter_path.text().strip():
+            try:
+                prefilter = load_prefilter_config(self.prefilter_path.text().strip())
+            except (OSError, ValueError) as e:
+                QMessageBox.warning(self, "Warning", f"Invalid glossary file: {str(e)}")
+                return
+
          # Clear previous samples
         self.translation_samples = []
         self.preview_btn.setEnabled(False)
 
         # Disable UI
         self.set_ui_enabled(False, running=True)
-        self.log_message(f"Starting translation from {source_lang} to {target_lang}")
-        
-        self.worker = TranslationWorker(input_file, output_file, field_mapping, source_lang, target_lang)
+        self.log_message(f"Starting translation from {source_lang} to {', '.join(targets)}")
+        if len(targets) > 1:
+            self.log_message("Output files: " + ", ".join(language_output_path(output_file, target)
+                                                          for target in targets))
+        
+        memory = None
+        if self.use_memory.isChecked():
+            try:
+                if self.memory is None:
+                    self.memory = TranslationMemory()
+                memory = self.memory
+                memory.reset_stats()
+            except Exception as e:
+                self.log_message(f"Translation memory unavailable: {str(e)}")
+
+        self.worker = TranslationWorker(input_file, output_file, field_mapping, source_lang, targets, memory=memory,
+                                        concurrency=self.concurrency.value(),
+                                        requests_per_second=self.rate_limit.value(),
+                                        delta=self.delta_mode.isChecked(), backend=self.backend.currentText(),
+                                        backend_options=backend_options, processes=self.processes.value(),
+                                        prefilter=prefilter)
         self.worker.progress.connect(self.update_progress)
         self.worker.field_progress.connect(self.update_field_progress)
         self.worker.finished.connect(self.translation_finished)
         self.worker.sample_ready.connect(self.collect_samples)
         self.worker.paused.connect(self.on_paused)
+        self.worker.resumed.connect(self.on_resumed)
+        self.worker.notice.connect(self.log_message)
+        self.worker.stats_updated.connect(self.update_stats)
+        self.stats_table.setRowCount(0)
         self.worker.start()
 
     def toggle_pause(self):
@@ -448,13 +710,15 @@ class TranslationApp(QMainWindow):
                 self.worker.pause()
             else:
                 self.worker.resume()
-                self.pause_btn.setText("Pause")
-                self.log_message("Translation resumed")
-        
+
     def on_paused(self):
         self.pause_btn.setText("Resume")
         self.log_message("Translation paused")
 
+    def on_resumed(self):
+        self.pause_btn.setText("Pause")
+        self.log_message("Translation resumed")
+
     def stop_translation(self):
         if self.worker:
             self.worker.stop()
@@ -466,9 +730,19 @@ class TranslationApp(QMainWindow):
         self.output_path.setEnabled(enabled)
         self.input_browse.setEnabled(enabled)
         self.output_browse.setEnabled(enabled)
+        self.prefilter_path.setEnabled(enabled)
+        self.prefilter_browse.setEnabled(enabled)
         self.mapping_group.setEnabled(enabled)
         self.source_lang.setEnabled(enabled)
         self.target_lang.setEnabled(enabled)
+        self.extra_targets.setEnabled(enabled)
+        self.use_memory.setEnabled(enabled)
+        self.backend.setEnabled(enabled)
+        self.backend_options.setEnabled(enabled)
+        self.concurrency.setEnabled(enabled)
+        self.rate_limit.setEnabled(enabled)
+        self.processes.setEnabled(enabled)
+        self.delta_mode.setEnabled(enabled)
         self.translate_btn.setEnabled(enabled)
         self.pause_btn.setEnabled(running)
         self.stop_btn.setEnabled(running)
@@ -482,6 +756,26 @@ class TranslationApp(QMainWindow):
         self.field_label.setText(f"Current field: {field_path}")
         self.log_message(f"Processing {field_path}")
 
+    def update_stats(self, metrics):
+        api = metrics['api']
+        latency = api['latency']
+        rows = [("Elapsed", f"{metrics['elapsed']:.1f} s")]
+        rows += [(f"Time: {stage}", f"{seconds:.2f} s") for stage, seconds in metrics['stages'].items()]
+        rows += [(name.replace('_', ' ').capitalize(), str(value)) for name, value in metrics['counters'].items()]
+        rows += [(name.replace('_', ' ').capitalize(), str(value)) for name, value in metrics['gauges'].items()]
+        rows += [
+            ("Products/s", str(metrics['throughput']['products_per_second'])),
+            ("Strings/s", str(metrics['throughput']['strings_per_second'])),
+            ("API calls", str(api['calls'])),
+            ("API errors", str(api['errors'])),
+            ("API latency mean / p95", f"{latency['mean'] or 0:.3f} s / {latency['p95'] or 0:.3f} s"),
+        ]
+        rows += [(f"Error: {name}", str(count)) for name, count in metrics['errors'].items()]
+        self.stats_table.setRowCount(len(rows))
+        for row, (name, value) in enumerate(rows):
+            self.stats_table.setItem(row, 0, QTableWidgetItem(name))
+            self.stats_table.setItem(row, 1, QTableWidgetItem(value))
+
     def collect_samples(self, samples):
         self.translation_samples = samples
         self.preview_btn.setEnabled(True)
@@ -507,6 +801,15 @@ class TranslationApp(QMainWindow):
             
         self.progress_label.setText("Ready")
 
+    def closeEvent(self, event):
+        if self.worker and self.worker.isRunning():
+            self.worker.resume()
+            self.worker.stop()
+            self.worker.wait()
+        if self.memory:
+            self.memory.close()
+        super().closeEvent(event)
+
 def main():
     app = QApplication(sys.argv)
     window = TranslationApp()